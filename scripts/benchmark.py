@@ -0,0 +1,208 @@
+import argparse
+import itertools as it
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+import utils as utils
+import features as fe
+import svm as svm
+
+# Benchmark of the hot paths of the reference model, on synthetic EEG-like recordings
+# Every stage is timed (best of a few runs) and its peak memory measured (in a separate run, with tracemalloc),
+# the results go to a JSON file, and compared against a baseline file to catch regressions
+#
+# python benchmark.py --samples 1048576 --channels 4 --output bench.json
+# python benchmark.py --baseline bench.json    (exits with 1 if a stage is slower by more than the tolerance)
+# python benchmark.py --dataset 3 4 5 6 --samples 6000    (only writes synthetic pairs to the dataset folder)
+
+#########################################
+# Setting of the parameters, the defaults of the command line
+#########################################
+
+fs = 500
+n_samples = 2**20       # samples per channel
+n_channels = 1
+window = 512
+classes = 2
+numtaps = 6
+cutoff = [0, 150, 200, 250]
+features = ['theta','alpha','linelength']
+n_supports = 200        # support vectors of the synthetic SVM
+dimensions = 2          # reduced dimensions, the input of the SVM
+repeats = 3             # runs per stage, the best time is kept
+tolerance = 0.2         # a stage is a regression if it is slower than the baseline by more than this fraction
+min_seconds = 1e-3      # and by more than this, the stages that take microseconds are mostly noise
+
+#########################################
+# Synthetic recordings
+#########################################
+
+# EEG-like signal: pink noise with theta and alpha rhythms, and a seizure in the second half
+# (high amplitude spike and wave around 3 Hz), labels are 0 then 1 like the dataset
+def synthetic_eeg(n_samples, n_channels, fs, seed=1):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples)/fs
+    # 1/f spectrum
+    spectrum = np.fft.rfft(rng.standard_normal((n_channels,n_samples)),axis=1)
+    spectrum /= np.maximum(np.fft.rfftfreq(n_samples,1/fs),1/fs) ** 0.5
+    X = np.fft.irfft(spectrum,n_samples,axis=1).T
+    X *= 20/np.std(X,axis=0)
+    X += 10*np.sin(2*np.pi*6*t).reshape((-1,1)) + 15*np.sin(2*np.pi*10*t + 1).reshape((-1,1))
+
+    y = np.zeros((n_samples,1))
+    y[n_samples//2:] = 1
+    seizure = t[n_samples//2:]
+    X[n_samples//2:] += (100*np.sign(np.sin(2*np.pi*3*seizure)) ** 8 * np.sin(2*np.pi*3*seizure)).reshape((-1,1))
+    return X, y
+
+# write the recording in the layout of the dataset, one CSV file per channel and one for the labels
+# this points the file names of utils to directory, the caller restores them
+def write_dataset(directory, X, y):
+    utils.channel_file = lambda channel, pair: os.path.join(directory,'channel%d_pair%d.csv' % (channel,pair))
+    utils.label_file = lambda pair: os.path.join(directory,'label%d.csv' % pair)
+    utils.cache_dir = os.path.join(directory,'cache')
+    for i in range(X.shape[1]):
+        np.savetxt(utils.channel_file(i+1,1),X[:,i:i+1],fmt='%.6f',delimiter=',')
+    # the labels are a single row
+    np.savetxt(utils.label_file(1),y.T,fmt='%d',delimiter=',')
+
+# write synthetic pairs where utils expects the dataset (../data), one seed per pair, e.g. to build
+# tests/arrays.h without the recordings, existing files are never overwritten
+def write_pairs(pairs, n_samples, n_channels, fs):
+    for pair in pairs:
+        X, y = synthetic_eeg(n_samples,n_channels,fs,seed=pair)
+        filenames = [utils.channel_file(i+1,pair) for i in range(n_channels)] + [utils.label_file(pair)]
+        for i in filenames:
+            if os.path.exists(i):
+                raise ValueError("%s already exists, the synthetic dataset does not replace recordings" % i)
+            os.makedirs(os.path.dirname(i),exist_ok=True)
+        for i in range(n_channels):
+            np.savetxt(filenames[i],X[:,i:i+1],fmt='%.6f',delimiter=',')
+        np.savetxt(filenames[-1],y.T,fmt='%d',delimiter=',')
+
+#########################################
+# Measurements
+#########################################
+
+def measure(function, *args):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'peak_bytes': peak}
+
+def run(config):
+    X_raw, y_raw = synthetic_eeg(config['samples'],config['channels'],fs)
+    lpf = utils.design_filter(numtaps,cutoff,fs)
+    filtered, valid_labels = utils.data_filtering(X_raw,y_raw,lpf)
+    X, y = fe.feature_extraction(features,filtered,valid_labels,fs,config['window'])
+
+    # a random SVM of the size of a trained one, on reduced features of the same count as the windows
+    rng = np.random.default_rng(2)
+    num_classifiers = len(list(it.combinations(range(config['classes']),2)))
+    X_reduced = rng.standard_normal((X.shape[0],dimensions))
+    supports = rng.standard_normal((n_supports,dimensions))
+    alpha_vector = rng.standard_normal((num_classifiers,n_supports))
+    intercept = rng.standard_normal(num_classifiers)
+    decision, vote = svm.get_decision(X_reduced,'poly',0,2,alpha_vector,supports,intercept,num_classifiers)
+
+    stages = {}
+    directory = tempfile.mkdtemp()
+    saved = (utils.channel_file, utils.label_file, utils.cache_dir)
+    try:
+        write_dataset(directory,X_raw,y_raw)
+        channel_num = list(range(1,config['channels']+1))
+        # the first load parses the CSV files, the next ones open the .npy copies
+        stages['load_dataset_csv'] = measure(utils.load_dataset,[1],channel_num,0,0)
+        stages['load_dataset'] = measure(utils.load_dataset,[1],channel_num,0)
+    finally:
+        utils.channel_file, utils.label_file, utils.cache_dir = saved
+        shutil.rmtree(directory,ignore_errors=True)
+
+    stages['design_filter'] = measure(utils.design_filter,numtaps,cutoff,fs)
+    stages['data_filtering'] = measure(utils.data_filtering,X_raw,y_raw,lpf)
+    stages['linelength'] = measure(fe.linelength,filtered,config['window'])
+    # bandpowers takes the bins of the bands, like feature_extraction
+    band_idx = [utils.get_idx(fe.bands[i],config['window'],fs) for i in ['theta','alpha']]
+    stages['bandpower'] = measure(fe.bandpowers,filtered,config['window'],band_idx,fs)
+    stages['feature_extraction'] = measure(fe.feature_extraction,features,filtered,valid_labels,fs,config['window'])
+    for kernel in ['poly','rbf']:
+        stages['get_decision_' + kernel] = measure(svm.get_decision,X_reduced,kernel,0,2,alpha_vector,supports,
+                                                   intercept,num_classifiers)
+    stages['predict'] = measure(svm.predict,X_reduced,None,'ovo',config['classes'],num_classifiers,decision,vote)
+
+    return {'config': config,
+            'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()},
+            'stages': stages}
+
+# stages slower than the baseline by more than tolerance, and a table of the comparison
+def compare(results, baseline, tolerance=tolerance):
+    if baseline['config'] != results['config']:
+        print("Warning! the baseline was run with a different configuration: %s" % baseline['config'])
+    regressions = []
+    print("%-22s %12s %12s %8s %14s" % ('stage', 'baseline (s)', 'now (s)', 'ratio', 'peak (MB)'))
+    for name, stage in results['stages'].items():
+        if name not in baseline['stages']:
+            print("%-22s %12s %12.4f %8s %14.1f" % (name, '-', stage['seconds'], '-', stage['peak_bytes']/2**20))
+            continue
+        ratio = stage['seconds']/baseline['stages'][name]['seconds']
+        flag = ''
+        if (ratio > 1 + tolerance) and (stage['seconds'] - baseline['stages'][name]['seconds'] > min_seconds):
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print("%-22s %12.4f %12.4f %8.2f %14.1f%s" % (name, baseline['stages'][name]['seconds'], stage['seconds'],
+                                                      ratio, stage['peak_bytes']/2**20, flag))
+    return regressions
+
+def print_results(results):
+    print("%-22s %12s %14s" % ('stage', 'time (s)', 'peak (MB)'))
+    for name, stage in results['stages'].items():
+        print("%-22s %12.4f %14.1f" % (name, stage['seconds'], stage['peak_bytes']/2**20))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=n_samples)
+    parser.add_argument('--channels', type=int, default=n_channels)
+    parser.add_argument('--window', type=int, default=window)
+    parser.add_argument('--classes', type=int, default=classes)
+    parser.add_argument('--repeats', type=int, default=repeats)
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=tolerance)
+    parser.add_argument('--dataset', type=int, nargs='+', metavar='PAIR',
+                        help='only write synthetic recordings of these pairs to the dataset folder, no benchmark')
+    args = parser.parse_args()
+
+    if args.dataset is not None:
+        write_pairs(args.dataset,args.samples,args.channels,fs)
+        sys.exit(0)
+
+    repeats = args.repeats
+    results = run({'samples': args.samples, 'channels': args.channels, 'window': args.window, 'classes': args.classes})
+
+    if args.output is not None:
+        with open(args.output,'w') as f:
+            json.dump(results,f,indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results,baseline,args.tolerance)
+        if len(regressions) > 0:
+            print("Slower than the baseline: %s" % ', '.join(regressions))
+            sys.exit(1)
+    else:
+        print_results(results)
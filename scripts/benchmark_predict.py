@@ -0,0 +1,60 @@
+import copy
+import itertools as it
+import time
+import numpy as np
+
+import svm as svm
+
+# Compares the vectorized svm.predict against the reference loop (svm.predict_reference)
+# on random decision values, for every classifier type and a few class counts
+
+#########################################
+# Setting of the parameters
+#########################################
+
+# number of test samples
+n_samples = 20000
+# number of classes to try
+class_list = [2, 3, 5, 8]
+# number of classifiers for ecoc
+ecoc_classifiers = 6
+# how many times each implementation is run, the best time is kept
+repeats = 3
+
+np.random.seed(1) # for reproducibility of results
+
+# a stand-in for the classifier, predict only reads the code book
+class CodeBook:
+    def __init__(self, code_book_):
+        self.code_book_ = code_book_
+
+def best_time(function, args):
+    times = []
+    for i in range(repeats):
+        # the reference implementation modifies the votes in place
+        run_args = copy.deepcopy(args)
+        start = time.perf_counter()
+        result = function(*run_args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+print("%-6s %-8s %-12s %-12s %-8s %s" % ('type', 'classes', 'loop (s)', 'vector (s)', 'speedup', 'match'))
+for class_type in ['ovo', 'ovr', 'ecoc']:
+    for classes in class_list:
+        if class_type == 'ovo':
+            num_classifiers = len(list(it.combinations(range(classes),2)))
+        elif class_type == 'ovr':
+            num_classifiers = 1 if classes == 2 else classes
+        else:
+            num_classifiers = ecoc_classifiers
+
+        clf = CodeBook(np.random.randint(0,2,(classes,num_classifiers))*2-1)
+        decision = np.random.randn(n_samples,num_classifiers)
+        vote = np.ndarray.tolist((decision > 0).astype(int))
+        args = (decision, clf, class_type, classes, num_classifiers, decision, vote)
+
+        loop_time, y_loop = best_time(svm.predict_reference, args)
+        vector_time, y_vector = best_time(svm.predict, args)
+
+        print("%-6s %-8d %-12.4f %-12.4f %-8.1f %s" % (class_type, classes, loop_time, vector_time,
+                                                       loop_time/vector_time, np.array_equal(y_loop,y_vector)))
@@ -0,0 +1,221 @@
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+from sklearn.ensemble import RandomForestClassifier
+
+import svm as svm
+
+# Registry of the classifier engines that have a Chisel block: svm, logistic, nn (neuralNet) and rf (randomForest)
+# Every engine trains with sklearn, extracts the configuration its block is loaded with, computes the
+# decision exactly like the block does (vectorized over the samples), and writes its configuration to CSV
+# Except for the SVM, the blocks are binary classifiers, predicting 1 when their decision is positive
+#
+# Common interface:
+#   fit(X, y)         train and extract the configuration
+#   decision(X)       the value the block thresholds (its raw votes), one row per sample
+#   predict(X)        the predicted labels
+#   export(directory) the configuration CSV files
+#   cost()            size of the configuration and number of multiplications per classification
+
+fmt = '%.10f' # 10 decimal places as float, same as top.py
+
+class SVM:
+    params = ['kernel', 'degree', 'coef', 'gamma', 'classes', 'class_type', 'max_iter', 'penalty', 'size_limit',
+              'size_method']
+
+    # size_limit is the number of support vectors to retain, None keeps them all, see svm.reduce_supports
+    def __init__(self, kernel='poly', degree=1, coef=0, gamma=1, classes=2, class_type='ovo',
+                 max_iter=10000, penalty=1, size_limit=None, size_method='first'):
+        self.kernel = kernel
+        self.degree = degree
+        self.coef = coef
+        self.gamma = gamma
+        self.classes = classes
+        self.class_type = class_type
+        self.max_iter = max_iter
+        self.penalty = penalty
+        self.size_limit = size_limit
+        self.size_method = size_method
+
+    def fit(self, X, y):
+        self.clf = svm.create_classifier(self.class_type, self.kernel, self.gamma, self.coef, self.degree,
+                                         self.max_iter, self.penalty)
+        self.clf.fit(X, y)
+        alpha_vector, supports, intercept, self.num_classifiers = svm.config_matrix(self.clf, self.class_type, self.classes)
+        self.alpha_vector, self.supports, self.intercept = svm.reduce_supports(alpha_vector, supports, intercept,
+                                                                               self.size_limit, self.kernel, self.coef,
+                                                                               self.degree, self.gamma, self.size_method, X)
+        return self
+
+    def decision(self, X):
+        linear = svm.linear_model(self.kernel, self.coef, self.degree, self.alpha_vector, self.supports,
+                                  self.intercept, self.gamma)
+        if linear is not None:
+            return svm.linear_decision(X, *linear)[0]
+        return svm.get_decision(X, self.kernel, self.coef, self.degree, self.alpha_vector, self.supports,
+                                self.intercept, self.num_classifiers, self.gamma)[0]
+
+    def predict(self, X):
+        decision = self.decision(X)
+        vote = np.ndarray.tolist((decision > 0).astype(int))
+        return svm.predict(X, self.clf, self.class_type, self.classes, self.num_classifiers, decision, vote)[:,0]
+
+    def export(self, directory='generated_files'):
+        np.savetxt(directory + "/support_vectors.csv", self.supports, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/alpha_vectors.csv", self.alpha_vector, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/intercepts.csv", self.intercept, fmt=fmt, delimiter=',')
+        if self.class_type == 'ecoc':
+            np.savetxt(directory + "/codebook.csv", self.clf.code_book_, fmt=fmt, delimiter=',')
+
+    def cost(self):
+        n_supports, n_features = self.supports.shape
+        return {'parameters': self.supports.size + self.alpha_vector.size + len(self.intercept),
+                'multiplies': n_supports*(n_features + max(self.degree-1,0)) + self.alpha_vector.size}
+
+# Logistic regression (logistic.scala), the decision is the dot product with the weights plus the intercept
+# the block is loaded with trained weights, its online learning is not modelled
+class Logistic:
+    params = ['penalty', 'max_iter']
+
+    def __init__(self, penalty=1, max_iter=10000):
+        self.penalty = penalty
+        self.max_iter = max_iter
+
+    def fit(self, X, y):
+        self.clf = LogisticRegression(C=self.penalty, max_iter=self.max_iter)
+        self.clf.fit(X, y)
+        self.weights = self.clf.coef_[0]
+        self.intercept = self.clf.intercept_[0]
+        return self
+
+    def decision(self, X):
+        return np.matmul(X, self.weights) + self.intercept
+
+    def predict(self, X):
+        return (self.decision(X) >= 0).astype(int)
+
+    def export(self, directory='generated_files'):
+        np.savetxt(directory + "/logistic_weights.csv", [self.weights], fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/logistic_intercept.csv", [self.intercept], fmt=fmt, delimiter=',')
+        # the logistic integration testers read the weights and intercept from the SVM files
+        np.savetxt(directory + "/support_vectors.csv", [self.weights], fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/alpha_vectors.csv", [[self.intercept]], fmt=fmt, delimiter=',')
+
+    def cost(self):
+        return {'parameters': len(self.weights) + 1, 'multiplies': len(self.weights)}
+
+# Fully connected network (neuralNet.scala): layers hidden layers of neurons ReLUs each, and one output
+# the decision is the output before its ReLU, the block predicts 1 when it is positive
+class NeuralNet:
+    params = ['neurons', 'layers', 'max_iter']
+
+    def __init__(self, neurons=4, layers=1, max_iter=10000):
+        self.neurons = neurons
+        self.layers = layers
+        self.max_iter = max_iter
+
+    def fit(self, X, y):
+        self.clf = MLPClassifier(hidden_layer_sizes=(self.neurons,)*self.layers, activation='relu',
+                                 max_iter=self.max_iter, random_state=109)
+        self.clf.fit(X, y)
+        # configuration of the block: inputWeights (neurons x features), midAndOutputWeights (one row per neuron
+        # of the layers after the first, then the output), biasVecs (layers x neurons) and outputBias
+        self.input_weights = self.clf.coefs_[0].T
+        self.mid_and_output_weights = np.concatenate([i.T for i in self.clf.coefs_[1:]])
+        self.bias_vecs = np.array(self.clf.intercepts_[:-1])
+        self.output_bias = self.clf.intercepts_[-1][0]
+        return self
+
+    def decision(self, X):
+        hidden = np.maximum(np.matmul(X, self.input_weights.T) + self.bias_vecs[0], 0)
+        for i in range(1, self.layers):
+            weights = self.mid_and_output_weights[(i-1)*self.neurons:i*self.neurons]
+            hidden = np.maximum(np.matmul(hidden, weights.T) + self.bias_vecs[i], 0)
+        return np.matmul(hidden, self.mid_and_output_weights[-1]) + self.output_bias
+
+    def predict(self, X):
+        return (self.decision(X) > 0).astype(int)
+
+    def export(self, directory='generated_files'):
+        np.savetxt(directory + "/nn_input_weights.csv", self.input_weights, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/nn_mid_and_output_weights.csv", self.mid_and_output_weights, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/nn_bias_vecs.csv", self.bias_vecs, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/nn_output_bias.csv", [self.output_bias], fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/nn_parameters.csv", [self.input_weights.shape[1], self.neurons, self.layers],
+                   fmt='%d', delimiter=',') # nFeatures, nNeurons, nLayers
+
+    def cost(self):
+        size = self.input_weights.size + self.mid_and_output_weights.size
+        return {'parameters': size + self.bias_vecs.size + 1, 'multiplies': size}
+
+# Random forest of complete trees (randomForest.scala)
+# node k of a tree compares feature featureSelect(k) with thresholds(k), and goes to node 2k+1 when it is
+# greater and 2k+2 otherwise, the last level picks leafVotes(2j+1) when greater and leafVotes(2j) otherwise
+# the leaf votes are the class 1 minus the class 0 probability, the block predicts 1 when their sum is not negative
+class RandomForest:
+    params = ['trees', 'depth']
+
+    def __init__(self, trees=8, depth=3):
+        self.trees = trees
+        self.depth = depth
+
+    def fit(self, X, y):
+        self.clf = RandomForestClassifier(n_estimators=self.trees, max_depth=self.depth, random_state=109)
+        self.clf.fit(X, y)
+        self.feature_select = np.zeros((self.trees, 2**self.depth-1), dtype=int)
+        self.thresholds = np.zeros((self.trees, 2**self.depth-1))
+        self.leaf_votes = np.zeros((self.trees, 2**self.depth))
+        for i, estimator in enumerate(self.clf.estimators_):
+            self.complete_tree(i, estimator.tree_, 0, 0, 0)
+        return self
+
+    # lay out the sklearn tree (which goes left when lower or equal) as a complete tree,
+    # a leaf above the last level is repeated on both sides of dummy nodes
+    def complete_tree(self, i, tree, node, k, level):
+        if level == self.depth:
+            counts = tree.value[node][0]
+            leaf = (k - (2**self.depth-1)) ^ 1
+            self.leaf_votes[i,leaf] = (counts[1] - counts[0]) / np.sum(counts)
+            return
+        if tree.children_left[node] == -1:
+            self.complete_tree(i, tree, node, 2*k+1, level+1)
+            self.complete_tree(i, tree, node, 2*k+2, level+1)
+            return
+        self.feature_select[i,k] = tree.feature[node]
+        self.thresholds[i,k] = tree.threshold[node]
+        self.complete_tree(i, tree, tree.children_right[node], 2*k+1, level+1)
+        self.complete_tree(i, tree, tree.children_left[node], 2*k+2, level+1)
+
+    # all the samples walk down all the trees at once, one level at a time
+    def decision(self, X):
+        rows = np.arange(X.shape[0]).reshape((-1,1))
+        trees = np.arange(self.trees)
+        node = np.zeros((X.shape[0], self.trees), dtype=int)
+        for level in range(self.depth):
+            greater = X[rows, self.feature_select[trees,node]] > self.thresholds[trees,node]
+            node = 2*node + np.where(greater, 1, 2)
+        leaf = (node - (2**self.depth-1)) ^ 1
+        return np.sum(self.leaf_votes[trees,leaf], axis=1)
+
+    def predict(self, X):
+        return (self.decision(X) >= 0).astype(int)
+
+    def export(self, directory='generated_files'):
+        np.savetxt(directory + "/rf_thresholds.csv", self.thresholds, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/rf_leaf_votes.csv", self.leaf_votes, fmt=fmt, delimiter=',')
+        np.savetxt(directory + "/rf_feature_select.csv", self.feature_select, fmt='%d', delimiter=',')
+        np.savetxt(directory + "/rf_parameters.csv", [self.clf.n_features_in_, self.depth, self.trees],
+                   fmt='%d', delimiter=',') # nFeatures, nDepth, nTrees
+
+    def cost(self):
+        return {'parameters': self.thresholds.size + self.leaf_votes.size, 'multiplies': 0}
+
+classifiers = {'svm': SVM, 'logistic': Logistic, 'nn': NeuralNet, 'rf': RandomForest}
+
+# create an (untrained) classifier, taking its parameters from config (a dict of any parameters)
+def create(name, config={}):
+    if name not in classifiers:
+        raise ValueError("Unknown classifier '%s', use one of %s" % (name, ', '.join(classifiers)))
+    engine = classifiers[name]
+    return engine(**dict((i, config[i]) for i in engine.params if i in config))
@@ -0,0 +1,132 @@
+import math
+import numpy as np
+
+import utils as utils
+import features as fe
+import fixedpoint as fxp
+
+# Fixed-point tables for the bare-metal C integration test (tests/wellness_IntegrationTest_FixedPoint.c)
+# arrays.h used to carry doubles that the core converted with (int64_t)(x * (1L << DATA_BP)) for every value,
+# here every table holds the integers of the fixed-point format already (see fixedpoint.py), quantized the
+# same way as the fixed-point model, so the C side only packs and compares integers
+# The expected outputs are the decisions of the fixed-point model, in the two lanes of the rawVotes output
+# (bit-exact with the hardware only without bandpower features, the FFT rounding is not modelled)
+# (lane 0 holds the magnitude of a negative decision, lane 1 a positive one)
+# The C test also runs an integer reference on the core, with integer MACs only: the FIR filter on the input
+# (checked against the filter output of the model), and the normalization and PCA folded into one matrix and
+# shift followed by the polynomial SVM, on the window features of the model (checked against the expected outputs)
+
+# rough cycle costs of the core (in order Rocket), used for the predicted cycle counts
+mac_cycles = 2      # load and multiply-accumulate of one coefficient, the multiplier is pipelined
+op_cycles = 1       # add, compare, shift
+mmio_cycles = 20    # uncached access to the datapath registers over the periphery bus
+
+# C initializer of an integer array of any number of dimensions
+def initializer(q):
+    q = np.asarray(q)
+    if q.ndim <= 1:
+        return '{' + ', '.join('%d' % i for i in np.ravel(q)) + '}'
+    return '{' + ', '.join(initializer(i) for i in q) + '}'
+
+def write_array(f, declaration, q):
+    f.write("static const int64_t %s = %s;\n\n" % (declaration,initializer(q)))
+
+# The normalization (x - mean)*recip_std followed by the PCA projection, as one matrix and one shift
+# this is what the integer reference computes per window, instead of the two steps of the hardware
+def folded_pca(mean, recip_std, components):
+    matrix = components*recip_std
+    return matrix, -np.matmul(matrix,mean)
+
+# Write arrays.h with the fixed-point tables, fmt is a fixedpoint.FixedPointFormat
+# decision is the output of fixedpoint.datapath on the input X_raw (a single channel), through the FIR filter lpf
+# the rawVotes lanes only hold a binary classifier, so there must be a single one, and the integer reference
+# only covers the polynomial kernel (linear is degree 1)
+# parameters (a dict) are written in a comment at the top, to tell which model and data produced the tables
+def write_header(filename, fmt, lpf, features, fs, window, mean, recip_std, components, kernel, degree,
+                 alpha_vector, supports, intercept, X_raw, decision, parameters={}):
+    if alpha_vector.shape[0] != 1:
+        raise ValueError("The expected outputs of the C test hold a single binary classifier, currently %d" % alpha_vector.shape[0])
+    if kernel not in ['poly', 'linear']:
+        raise ValueError("The integer reference of the C test only covers the poly and linear kernels, currently %s" % kernel)
+    if kernel == 'linear':
+        degree = 1
+    decision = fmt.quantize(decision).reshape((len(decision),-1))
+    # the intermediate results of the model, for the integer reference
+    filtered = fxp.fir(fmt,fmt.quantize(X_raw),fmt.quantize(lpf))
+    window_features = fxp.feature_extraction(fmt,features,filtered,fs,window)
+    folded_matrix, folded_shift = folded_pca(mean,recip_std,components)
+    # the rawVotes of a binary classifier are split in two lanes by sign
+    expected = np.hstack((np.maximum(-decision[:,0:1],0),np.maximum(decision[:,0:1],0)))
+
+    with open(filename,'w') as f:
+        f.write("#ifndef __ARRAY_H__\n#define __ARRAY_H__\n\n")
+        if len(parameters) > 0:
+            f.write("// generated by scripts/top.py (ctables.write_header) with\n")
+            for name, value in parameters.items():
+                f.write("//   %s = %s\n" % (name,value))
+            f.write("\n")
+        f.write("#include <stdint.h>\n\n")
+        f.write("#define DIMENSIONS %d         // number of channels going into the PCA\n" % components.shape[1])
+        f.write("#define FEATURES %d           // number of reduced dimensions going into the SVM\n" % components.shape[0])
+        f.write("#define SUPPORTS %d           // number of support vectors for SVM\n" % supports.shape[0])
+        f.write("#define CLASSIFIERS %d        // number of classifiers created\n\n" % alpha_vector.shape[0])
+        f.write("#define NUMTAPS %d         // number of filter taps, for output adjustment\n" % len(lpf))
+        f.write("#define WINDOW %d         // number of lanes/bins/window, for output adjustment\n\n" % window)
+        f.write("#define DATA_WIDTH %d         // total bit size\n" % fmt.width)
+        f.write("#define DATA_BP %d         // number of fractional components\n" % fmt.bp)
+        f.write("#define SAMPLES %d         // number of input samples\n" % len(X_raw))
+        f.write("#define FILTERED %d         // number of filter outputs\n" % len(filtered))
+        f.write("#define WINDOWS %d         // number of windows, with one decision each\n" % len(decision))
+        f.write("#define KERNEL_DEGREE %d         // degree of the polynomial kernel\n\n" % degree)
+        f.write("// all the tables hold fixed-point integers, the values scaled by 2^DATA_BP\n\n")
+
+        write_array(f,"filterTaps[NUMTAPS]",fmt.quantize(lpf))
+        write_array(f,"pcaVector[FEATURES][DIMENSIONS]",fmt.quantize(components))
+        write_array(f,"PCANormVector[DIMENSIONS][2]",fmt.quantize(np.array([mean,recip_std]).T))
+        write_array(f,"foldedPCAVector[FEATURES][DIMENSIONS]",fmt.quantize(folded_matrix))
+        write_array(f,"foldedPCAShift[FEATURES]",fmt.quantize(folded_shift))
+        write_array(f,"SVMSupportVector[SUPPORTS][FEATURES]",fmt.quantize(supports))
+        write_array(f,"SVMAlphaVector[CLASSIFIERS][SUPPORTS]",fmt.quantize(alpha_vector))
+        write_array(f,"SVMIntercept[CLASSIFIERS]",fmt.quantize(intercept))
+        write_array(f,"in[SAMPLES]",fmt.quantize(np.ravel(X_raw)))
+        write_array(f,"filterOut[FILTERED]",np.ravel(filtered))
+        write_array(f,"windowFeatures[WINDOWS][DIMENSIONS]",window_features)
+        write_array(f,"ex[WINDOWS][2]",expected)
+        f.write("#endif\n")
+
+# Predicted cycles per input sample, per stage, of an integer reference of the datapath running on the core,
+# and of the MMIO traffic of the test (one write and one read of the datapath, and their count registers)
+# every sample completes a window, so the window features are updated for every sample
+# with sos (the IIR filter in use), the filter is a cascade of direct form II sections, 5 MACs each
+def predicted_cycles(features, window, fs, numtaps, components, supports, alpha_vector, degree, sos=None):
+    cycles = {'filter': (numtaps if sos is None else 5*len(sos))*mac_cycles}
+
+    feature_cycles = 0
+    band_features = [i for i in features if i in fe.bands]
+    if len(band_features) > 0:
+        # radix-2 FFT of the window, 4 real multiplies per butterfly
+        feature_cycles += (window//2)*int(math.log2(window))*4*mac_cycles
+        for i in band_features:
+            start, end = utils.get_idx(fe.bands[i],window,fs)
+            # squared magnitude of every bin of the band
+            feature_cycles += (end-start+1)*2*mac_cycles
+    for i in features:
+        if i in ['linelength','sumsquares']:
+            # running sums, one value enters and one leaves the window
+            feature_cycles += 4*op_cycles + (mac_cycles if i == 'sumsquares' else 0)
+    cycles['features'] = feature_cycles
+
+    # without PCA (components None) only the normalization is left, on the features that go to the SVM
+    if components is None:
+        cycles['pca'] = supports.shape[1]*mac_cycles
+    else:
+        # the normalization is folded into the PCA matrix, plus one shift per dimension
+        n_features, n_dimensions = components.shape[1], components.shape[0]
+        cycles['pca'] = n_features*n_dimensions*mac_cycles + n_dimensions*op_cycles
+    cycles['svm'] = (supports.shape[0]*(supports.shape[1] + max(degree-1,0)) + alpha_vector.size)*mac_cycles
+    cycles['mmio'] = 4*mmio_cycles
+    cycles['total'] = sum(cycles.values())
+    return cycles
+
+def print_cycles(cycles):
+    print("Predicted cycles per sample: " + ', '.join('%s %d' % (i,j) for i, j in cycles.items()))
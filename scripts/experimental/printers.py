@@ -1,6 +1,7 @@
-import math
+import numpy as np
 import utils as utils
 import features as fe
+import fixedpoint as fxp
 import os
 
 def print_indices(f,freq_band,window,fs):
@@ -9,48 +10,80 @@ def print_indices(f,freq_band,window,fs):
     f.write("val idxEndBin = %d\n" % idxEndBin)
     f.write("\n\n")
 
-def print_array_to_file(f,array_name,part,configs):
-    array_container = repr(array_name)
-    array_container = array_container.replace('array','').replace('(','').replace(')','')
-    array_container = array_container.replace('. ','').replace('.,',',').replace('.]',']')
-    if part == 'mid':
-        array_container = array_container.replace('[','').replace(']',',')
-    elif part == 'all':
-        array_container = array_container.replace('[','{').replace(']','}')
-    elif part == 'end':
-        array_container = array_container.replace('[','').replace(']','}')
-    elif part == 'scala':
-        array_container = array_container.replace('[','Seq(').replace(']',')')
+# number of values formatted per write, the text of an array is never built whole in memory
+chunk = 4096
+
+# values as the integers the C test feeds the datapath: scaled by 2**DATA_BP, rounded to the nearest value and
+# wrapped to DATA_WIDTH bits, the same conversion as the model and ctables.py (fixedpoint.quantize)
+def to_fixed(values, data_width, data_bp):
+    return fxp.quantize(values,data_width,data_bp)
+
+# write the values of an array, flattened, as a comma separated list straight to f
+# fixed=(DATA_WIDTH, DATA_BP) writes the fixed-point integers instead of the floating point values
+# the floating point values keep 17 significant digits, enough to read back the same doubles
+def write_values(f, values, fixed=None, fmt='%.17g'):
+    values = np.ravel(values)
+    if fixed is not None:
+        values = to_fixed(values,*fixed)
+        fmt = '%d'
+    for start in range(0,len(values),chunk):
+        block = values[start:start+chunk].tolist()
+        if start > 0: f.write(",\n        ")
+        f.write(", ".join([fmt]*len(block)) % tuple(block))
+
+# nested list of a matrix (any number of dimensions), {..} for C and Seq(..) for Scala
+def write_nested(f, array, opening, closing, fixed=None):
+    array = np.asarray(array)
+    f.write(opening)
+    if array.ndim <= 1:
+        write_values(f,array,fixed)
+    else:
+        for i in range(array.shape[0]):
+            if i > 0: f.write(", ")
+            write_nested(f,array[i],opening,closing,fixed)
+    f.write(closing)
+
+# part: 'all' for a C initializer, 'scala' for a Seq, 'intercept' for a flat C initializer
+# configs only picks whether the statement ends with a brace, as before
+def print_array_to_file(f,array_name,part,configs,fixed=None):
+    if part == 'scala':
+        write_nested(f,array_name,'Seq(',')',fixed)
     elif part == 'intercept':
-        array_container = array_container.replace('[[','{').replace(']]','}')
-        
-    f.write(array_container)
-    if part == 'mid':   f.write("\n        ")
+        write_nested(f,np.ravel(array_name),'{','}',fixed)
     else:
-        if configs == 1: f.write("};\n\n")
-        else:            f.write(";\n\n")
+        write_nested(f,array_name,'{','}',fixed)
+    if configs == 1: f.write("};\n\n")
+    else:            f.write(";\n\n")
 
-def print_matrices (f, name, matrix, configs):
+# C arrays of the columns of a matrix
+# configs == 1 writes a single 2D array with one row per column, otherwise one array per column (name0, name1...)
+# with fixed=(DATA_WIDTH, DATA_BP) the arrays hold the fixed-point integers (int64_t) instead of doubles
+def print_matrices (f, name, matrix, configs, fixed=None):
+    ctype = 'double' if fixed is None else 'int64_t'
+    if configs == 1:
+        f.write("%s %s[][%d] = {" % (ctype,name,matrix.shape[0]))
     for i in range(matrix.shape[1]):
         if configs == 1:
-            f.write("double %s[][] = {{" % name)
+            if i > 0: f.write(",\n    ")
         else:
-            f.write("double %s%d[] = {" % (name,i))
-        if len(matrix[:,i]) >= 1000:
-            for j in range(math.floor(len(matrix[:,i]) / 1000)):
-                print_array_to_file(f,matrix[j*1000:((j+1)*1000)-1,i],'mid',configs)
-        else: j = -1
-        print_array_to_file(f,matrix[(j+1)*1000:,i],'end',configs)
+            f.write("%s %s%d[] = " % (ctype,name,i))
+        f.write("{")
+        write_values(f,matrix[:,i],fixed)
+        f.write("}")
+        if configs != 1: f.write(";\n\n")
+    if configs == 1: f.write("};\n\n")
 
 def generate_files(X_test_raw, y_test_raw, fs, 
                    normalize, X_train_mean, X_train_var,
                    lpf,
                    do_pca, pca,
                    alpha_vector, supports, intercept,
-                   class_type, clf):
+                   class_type, clf, fixed=None):
+    # fixed=(DATA_WIDTH, DATA_BP) prints the input and the C arrays as fixed-point integers
+    ctype = 'double' if fixed is None else 'int64_t'
     # print the input channel
     f = open("generated_files/input_matrix.txt","w")
-    print_matrices(f,'input',X_test_raw, 0)
+    print_matrices(f,'input',X_test_raw, 0, fixed)
     f.close()
     
     # print the corresponding label for checking purposes, if you want
@@ -94,18 +127,18 @@ def generate_files(X_test_raw, y_test_raw, fs,
     
     if do_pca == 1:
         # the PCA transformation matrix
-        f.write("double PCAComponents[][] = ")
-        print_array_to_file(f,pca.components_,'all',0)
+        f.write("%s PCAComponents[][%d] = " % (ctype,pca.components_.shape[1]))
+        print_array_to_file(f,pca.components_,'all',0,fixed)
     
     # the support vector weights, the alpha vector
-    print_matrices(f,'SVMAlphaVector',alpha_vector.T,1)
+    print_matrices(f,'SVMAlphaVector',alpha_vector.T,1,fixed)
     
     # the actual support vectors
-    print_matrices(f,'SVMSupportVector',supports,1)
+    print_matrices(f,'SVMSupportVector',supports,1,fixed)
     
     # the SVM intercept
-    f.write("double SVMIntercept[] = ")
-    print_array_to_file(f,intercept,'intercept',0)
+    f.write("%s SVMIntercept[] = " % ctype)
+    print_array_to_file(f,intercept,'intercept',0,fixed)
     
     f.close()
     
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+# Binary export of the configuration and test vectors under generated_files
+# All the arrays go to a single file that can be memory mapped:
+#   magic        8 bytes, b'WELLBIN\0'
+#   version      uint32, little-endian
+#   header size  uint32, little-endian
+#   header       JSON: the parameters, and the dtype, shape, offset, format and sha1 of every array,
+#                and the sha1 of the CSV files written next to it
+#   arrays       raw little-endian, C order, each one aligned to align bytes, the offsets count from the
+#                end of the header (which is padded to align)
+# The CSV files the Scala testers read (readCSV) can still be written along, or regenerated from the binary file
+# later, and their checksums in the header tell when generated_files has gone stale
+
+magic = b'WELLBIN\0'
+version = 1
+align = 64
+# default name of the binary file in the export directory
+bundle_name = 'generated.bin'
+
+def checksum(data):
+    return hashlib.sha1(data).hexdigest()
+
+def file_checksum(filename):
+    h = hashlib.sha1()
+    with open(filename,'rb') as f:
+        for block in iter(lambda: f.read(2**20),b''):
+            h.update(block)
+    return h.hexdigest()
+
+# arrays are stored as little-endian 64-bit floats or integers
+def little_endian(array):
+    array = np.asarray(array)
+    if array.dtype.kind in 'biu':
+        return np.ascontiguousarray(array,dtype='<i8')
+    return np.ascontiguousarray(array,dtype='<f8')
+
+def padding(size):
+    return -size % align
+
+# Collects the arrays of an export, the file is written by close()
+# with csv=1 every array is also written as name.csv with np.savetxt, as the Scala testers expect
+class Writer:
+    def __init__(self, directory='generated_files', csv=1, filename=bundle_name):
+        self.directory = directory
+        self.csv = csv
+        self.filename = os.path.join(directory,filename)
+        self.arrays = {}
+        self.strings = {}
+        self.csv_checksums = {}
+        os.makedirs(directory,exist_ok=True)
+
+    def save(self, name, array, fmt='%.10f'):
+        array = np.asarray(array)
+        if array.dtype.kind in 'USO':
+            # lists of names go to the header
+            self.strings[name] = [str(i) for i in np.ravel(array)]
+        else:
+            self.arrays[name] = (little_endian(array), fmt)
+        if self.csv == 1:
+            csvfile = os.path.join(self.directory,name + '.csv')
+            np.savetxt(csvfile,array,fmt=fmt,delimiter=',')
+            self.csv_checksums[name] = file_checksum(csvfile)
+
+    # writes the binary file, parameters is a dict of anything JSON can hold
+    def close(self, parameters={}):
+        arrays = {}
+        offset = 0
+        for name, (array, fmt) in self.arrays.items():
+            arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset, 'fmt': fmt,
+                            'sha1': checksum(array)}
+            offset += array.nbytes + padding(array.nbytes)
+        header = {'version': version, 'parameters': parameters, 'arrays': arrays, 'strings': self.strings,
+                  'csv': self.csv_checksums}
+
+        text = json.dumps(header).encode()
+        start = len(magic) + 8 + len(text)
+        text += b' '*padding(start)
+        temporary = self.filename + '.tmp%d' % os.getpid()
+        with open(temporary,'wb') as f:
+            f.write(magic)
+            f.write(struct.pack('<II',version,len(text)))
+            f.write(text)
+            for array, fmt in self.arrays.values():
+                f.write(array.tobytes())
+                f.write(b'\0'*padding(array.nbytes))
+        os.replace(temporary,self.filename)
+
+def read_header(filename):
+    with open(filename,'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError("%s is not a binary export" % filename)
+        file_version, size = struct.unpack('<II',f.read(8))
+        if file_version > version:
+            raise ValueError("%s has version %d, this reader only knows up to %d" % (filename,file_version,version))
+        header = json.loads(f.read(size).decode())
+    header['start'] = len(magic) + 8 + size
+    return header
+
+# Read a binary export, returns (parameters, arrays, strings), the arrays are read-only memory maps
+# with verify=True the checksum of every array is checked, which reads all of them
+def read(filename, verify=False):
+    header = read_header(filename)
+    arrays = {}
+    for name, info in header['arrays'].items():
+        shape = tuple(info['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape,dtype=info['dtype'])
+            continue
+        arrays[name] = np.memmap(filename,dtype=info['dtype'],mode='r',offset=header['start']+info['offset'],shape=shape)
+        if verify and (checksum(np.ascontiguousarray(arrays[name])) != info['sha1']):
+            raise ValueError("Array %s of %s does not match its checksum" % (name,filename))
+    return header['parameters'], arrays, header['strings']
+
+# names of the exported arrays whose CSV file differs from the one written with the binary file,
+# or is missing, or was left over by an older export (when the CSV files were not written this time)
+def stale(directory='generated_files', filename=bundle_name):
+    header = read_header(os.path.join(directory,filename))
+    names = []
+    for name in list(header['arrays']) + list(header['strings']):
+        csvfile = os.path.join(directory,name + '.csv')
+        expected = header['csv'].get(name)
+        if expected is None:
+            if os.path.exists(csvfile): names.append(name)
+        elif (not os.path.exists(csvfile)) or (file_checksum(csvfile) != expected):
+            names.append(name)
+    return names
+
+# CSV compatibility: write (again) the CSV files of a binary export, the same as Writer with csv=1
+def to_csv(directory='generated_files', filename=bundle_name):
+    header = read_header(os.path.join(directory,filename))
+    parameters, arrays, strings = read(os.path.join(directory,filename))
+    for name, array in arrays.items():
+        np.savetxt(os.path.join(directory,name + '.csv'),array,fmt=header['arrays'][name]['fmt'],delimiter=',')
+    for name, values in strings.items():
+        np.savetxt(os.path.join(directory,name + '.csv'),values,fmt='%s',delimiter=',')
+
+# read one array, from the binary export if there is one, else from its CSV file
+def load(name, directory='generated_files', filename=bundle_name):
+    path = os.path.join(directory,filename)
+    if os.path.exists(path):
+        parameters, arrays, strings = read(path)
+        if name in arrays: return arrays[name]
+        if name in strings: return np.array(strings[name])
+    return np.loadtxt(os.path.join(directory,name + '.csv'),delimiter=',',ndmin=1)
+
+# python export.py [directory] checks an export: the array checksums, and which CSV files are stale
+# python export.py [directory] csv regenerates the CSV files
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'generated_files'
+    if (len(sys.argv) > 2) and (sys.argv[2] == 'csv'):
+        to_csv(directory)
+    parameters, arrays, strings = read(os.path.join(directory,bundle_name),verify=True)
+    print("%d arrays, parameters: %s" % (len(arrays),parameters))
+    names = stale(directory)
+    if len(names) > 0:
+        print("Stale CSV files: %s" % ', '.join(names))
+        sys.exit(1)
@@ -1,5 +1,8 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import utils as utils
+import parallel as parallel
+import instrument as ins
 
 # frequency bands in Hz
 delta_band = [0, 4]
@@ -8,52 +11,314 @@ alpha_band = [8, 16]
 beta_band = [16, 32]
 gamma_band = [32, 96]
 
+# all bandpower features, by name
+bands = {'delta': delta_band, 'theta': theta_band, 'alpha': alpha_band, 'beta': beta_band, 'gamma': gamma_band}
+
 # post computation normalization values
 line_normalize = 2**3
 band_normalize = 2**23
 
+# Prefix sum over time (one row of zeros in front), for all channels at once
+# the sum over any window is then a single subtraction, and one prefix sum serves every window size
+def prefix_sum(values):
+    prefix = np.zeros((values.shape[0]+1,values.shape[1]),dtype=values.dtype)
+    np.cumsum(values,axis=0,out=prefix[1:])
+    return prefix
+
+# prefix sum of the absolute differences
+def line_prefix(data):
+    return prefix_sum(np.abs(np.diff(data,axis=0)))
+
 # Line length
-def linelength(data,window):
-    datalength = abs(np.diff(data,axis=0))
+# out can be given to write the result in place, it must be (data.shape[0]-window, channels)
+def linelength(data,window,out=None,prefix=None):
+    if prefix is None:
+        prefix = line_prefix(data)
+    n = max(prefix.shape[0]-window,0)
+    out = np.subtract(prefix[window:window+n],prefix[:n],out=out)
+    
+    out /= (window*line_normalize)
+    return out
+
+# Integer line length, bit-exact with the accumulator of lineLength.scala for integer (or scaled fixed-point) data
+# the hardware only keeps the last window-1 differences, and normalizes with >> log2(window) >> 3
+def linelength_int(data,window,out=None,prefix=None):
+    if (window < 2) or (window & (window-1) != 0):
+        raise ValueError("Window size must be a power of 2 greater than 1, currently %d" % window)
+    if prefix is None:
+        prefix = line_prefix(data)
+    n = max(prefix.shape[0]-window,0)
+    out = np.subtract(prefix[window-1:window-1+n],prefix[:n],out=out)
+    
+    out >>= (window.bit_length()-1) + (line_normalize.bit_length()-1)
+    return out
+
+# line length for several window sizes, sharing one prefix sum, returns one array per window
+def linelengths(data,windows,integer=False):
+    prefix = line_prefix(data)
+    if integer:
+        return [linelength_int(data,i,prefix=prefix) for i in windows]
+    return [linelength(data,i,prefix=prefix) for i in windows]
+
+# Sum of squares (time domain power) of the samples of each window, the same ones as the bandpower
+# by Parseval, the sum over all the FFT bins of the window divided by the window size
+# normalized like the line length, as in SumSquares.scala
+def sumsquares(data,window,out=None,prefix=None):
+    if prefix is None:
+        prefix = prefix_sum(data*data)
+    n = max(prefix.shape[0]-1-window,0)
+    out = np.subtract(prefix[window:window+n],prefix[:n],out=out)
+    
+    out /= (window*line_normalize)
+    return out
+
+# Integer sum of squares, bit-exact with the accumulator of SumSquares.scala for integer data
+# the hardware only keeps the squares of the last window-1 samples, and normalizes with >> log2(window) >> 3
+# prefix can be given as the prefix sum of the squares, e.g. after storing them in a narrower type
+def sumsquares_int(data,window,out=None,prefix=None):
+    if (window < 2) or (window & (window-1) != 0):
+        raise ValueError("Window size must be a power of 2 greater than 1, currently %d" % window)
+    if prefix is None:
+        prefix = prefix_sum(data*data)
+    n = max(prefix.shape[0]-1-window,0)
+    out = np.subtract(prefix[window:window+n],prefix[1:1+n],out=out)
+    
+    out >>= (window.bit_length()-1) + (line_normalize.bit_length()-1)
+    return out
+
+# number of windows transformed at once by the STFT engine, bounds the memory used per batch
+stft_block = 4096
+
+# Sliding window of FFTs (an STFT with overlap being window-1), computed once for all bands
+# freq_bands is a list of [idxStartBin, idxEndBin] pairs, as returned by utils.get_idx
+# out can be given as a list of arrays (one per band) to write the results in place
+def stft_bandpower(data,window,freq_bands,fs,out=None):
+    n_windows = max(data.shape[0]-window,0)
+    m = int(window/2)
+    if out is None:
+        out = [np.empty((n_windows,data.shape[1])) for band in freq_bands]
+    
+    # strided view of all windows, no copies are made here: (windows, channels, window)
+    frames = sliding_window_view(data,window,axis=0)
+    
+    for start in range(0,n_windows,stft_block):
+        stop = min(start+stft_block,n_windows)
+        # the input is real, so the one-sided spectrum is all we need
+        p1 = np.abs(np.fft.rfft(frames[start:stop],axis=2)) ** 2
+        p1[:,:,1:m] *= 2
+        
+        for band, bandpower in zip(freq_bands,out):
+            # contiguous bins, so that the summation order does not depend on the number of channels
+            bandpower[start:stop] = (np.sum(np.ascontiguousarray(p1[:,:,band[0]:band[1]]),axis=2)/
+                                     ((band[1]-band[0])**2))
+    
+    for bandpower in out:
+        bandpower /= band_normalize
+    return out
+
+# number of windows between resynchronizations of the sliding DFT, bounds the numerical drift
+sdft_resync = 1024
+
+# Sliding DFT, each window differs from the previous one by a single sample
+# so every tracked bin is updated with X_k(i+1) = (X_k(i) - x[i] + x[i+window]) * exp(2j*pi*k/window)
+# only the bins inside the requested bands are tracked, which is O(bins) per sample instead of O(N log N)
+def sliding_dft_bandpower(data,window,freq_bands,fs,out=None,resync=sdft_resync):
+    n_windows = max(data.shape[0]-window,0)
+    m = int(window/2)
+    if out is None:
+        out = [np.empty((n_windows,data.shape[1])) for band in freq_bands]
+    
+    # union of the bins of all bands, clipped to the one-sided spectrum like the FFT path
+    band_bins = [np.arange(band[0],min(band[1],m+1)) for band in freq_bands]
+    bins = np.unique(np.concatenate(band_bins)).astype(int)
+    band_cols = [np.searchsorted(bins,i) for i in band_bins]
+    scale = np.where((bins >= 1) & (bins < m),2,1)
     
-    for i in range(data.shape[1]):
-        if i == 0:
-            temp = np.convolve(datalength[:,i],np.ones(window,dtype=int),'valid')
-            cumsum = temp.reshape((len(temp),1))
-        else:
-            temp = np.convolve(datalength[:,i],np.ones(window,dtype=int),'valid').reshape((len(temp),1))
-            cumsum = np.concatenate((cumsum,temp),axis=1)
+    # the twiddle factors are periodic in the window size, so a single table is enough
+    twiddle = np.exp(-2j*np.pi*np.outer(np.arange(window),bins)/window)
+    
+    # the recurrence is unrolled as a running sum of x[n]*exp(-2j*pi*k*n/window) within a block
+    # the magnitude of the window DFT is the difference of two running sums (the phase term cancels)
+    # the running sum restarts every resync windows, which resynchronizes the bins to an exact DFT
+    for start in range(0,n_windows,resync):
+        stop = min(start+resync,n_windows)
+        segment = data[start:stop+window-1]
+        phase = twiddle[np.arange(len(segment)) % window]
+        
+        acc = np.zeros((len(segment)+1,data.shape[1],len(bins)),dtype=complex)
+        np.cumsum(segment[:,:,np.newaxis]*phase[:,np.newaxis,:],axis=0,out=acc[1:])
+        p1 = np.abs(acc[window:]-acc[:-window]) ** 2 * scale
+        
+        for cols, band, bandpower in zip(band_cols,freq_bands,out):
+            bandpower[start:stop] = (np.sum(p1[:,:,cols],axis=2)/
+                                     ((band[1]-band[0])**2))
+    
+    for bandpower in out:
+        bandpower /= band_normalize
+    return out
 
-    return cumsum/(window*line_normalize) 
+# Bandpower of several bands at once, method is either 'fft' (the reference) or 'sliding_dft'
+def bandpowers(data,window,freq_bands,fs,method='fft',out=None):
+    if method == 'fft':
+        return stft_bandpower(data,window,freq_bands,fs,out)
+    elif method == 'sliding_dft':
+        return sliding_dft_bandpower(data,window,freq_bands,fs,out)
+    else:
+        raise ValueError("Unknown bandpower method '%s', use 'fft' or 'sliding_dft'" % method)
 
 # Bandpower
-def bandpower(data,window,freq_band,fs):
+def bandpower(data,window,freq_band,fs,method='fft'):
+    return bandpowers(data,window,[freq_band],fs,method)[0]
+
+# Discrete wavelet transform (DWT.scala): every level filters the approximation coefficients of the previous
+# level with the low pass and high pass filters of the wavelet, then keeps every other output
+# decomposition low pass filters, the high pass filter is their quadrature mirror
+wavelets = {
+    'haar': [0.7071067811865476, 0.7071067811865476],
+    'db2': [-0.12940952255126037, 0.2241438680420134, 0.8365163037378079, 0.48296291314453416],
+    'db4': [-0.010597401785069032, 0.0328830116668852, 0.030841381835560764, -0.18703481171909309,
+            -0.027983769416859854, 0.6308807679298589, 0.7148465705529157, 0.2303778133088965],
+}
 
-    bandpower = []
-    # This is like an STFT, a sliding window of FFTs with overlap being window-1
-    for i in range(data.shape[0]-window):
-        fft_res = np.fft.fft(data[i:i+window,:],axis=0)
+def wavelet_filters(wavelet):
+    if wavelet not in wavelets:
+        raise ValueError("Unknown wavelet '%s', use one of %s" % (wavelet, ', '.join(wavelets)))
+    lpf = np.array(wavelets[wavelet])
+    hpf = lpf[::-1] * (-1.0)**(np.arange(len(lpf))+1)
+    return lpf, hpf
+
+# DWT features are named dwt_d<level> (detail coefficients) or dwt_a<level> (approximation coefficients)
+# returns ('d' or 'a', level), or None for any other feature
+def dwt_feature(name):
+    if name.startswith('dwt_') and (name[4:5] in ['d','a']) and name[5:].isdigit() and int(name[5:]) > 0:
+        return name[4], int(name[5:])
+    return None
+
+# causal filter from a zero state, one output per input like the FIR filters of the DWT
+def causal_fir(data,taps):
+    return utils.fir(np.concatenate((np.zeros((len(taps)-1,data.shape[1])),data)),taps)
+
+# DWT of all channels at once, up to the given level
+# like the decimators of the hardware, level l keeps the samples at times t with t+1 a multiple of 2**l,
+# position is the time of the first sample, so that a chunk of a stream is decimated like the whole recording
+# returns the detail and approximation coefficients of every level, and the time of their first coefficient
+def dwt(data,levels,wavelet='haar',position=0):
+    lpf, hpf = wavelet_filters(wavelet)
+    details = []
+    approxs = []
+    starts = []
+    approx = data
+    start = 0
+    step = 1
+    for level in range(levels):
+        # the coefficients of the previous level are at times start + k*step, keep every other one
+        first = 0 if (position+start+1) % (2*step) == 0 else 1
+        details.append(causal_fir(approx,hpf)[first::2])
+        approx = causal_fir(approx,lpf)[first::2]
+        approxs.append(approx)
+        start += first*step
+        step *= 2
+        starts.append(start)
+    return details, approxs, starts
+
+# Mean energy of the coefficients of each window, for a list of (kind, level) as returned by dwt_feature
+# the transform is computed once for all windows and levels, and the energy of every window
+# is a difference of prefix sums of the squared coefficients
+def dwt_energies(data,window,dwt_features,wavelet='haar',out=None,position=0):
+    levels = max(i[1] for i in dwt_features)
+    if window % 2**levels != 0:
+        raise ValueError("Window size %d must be a multiple of 2**%d for the DWT features" % (window, levels))
+    n_windows = max(data.shape[0]-window,0)
+    if out is None:
+        out = [np.empty((n_windows,data.shape[1])) for i in dwt_features]
+    
+    details, approxs, starts = dwt(data,levels,wavelet,position)
+    first = np.arange(n_windows)
+    for (kind, level), energy in zip(dwt_features,out):
+        coeffs = details[level-1] if kind == 'd' else approxs[level-1]
+        step = 2**level
+        prefix = np.zeros((coeffs.shape[0]+1,data.shape[1]))
+        np.cumsum(np.ascontiguousarray(coeffs*coeffs),axis=0,out=prefix[1:])
+        # coefficients with a time within [i, i+window-1] for the window starting at i
+        lo = -((starts[level-1]-first) // step)
+        hi = (first+window-1-starts[level-1]) // step + 1
+        energy[:] = (prefix[hi] - prefix[lo]) / (window // step)
+    return out
 
-        p2 = np.abs(fft_res) ** 2
-        m = int(window/2)
-        p1 = p2[0:m+1,:]
-        p1[1:m,:] = 2*p2[1:m,:]
+# Computes a fixed list of features, configured once and reused for any number of signals
+# the output has one column per (feature, channel), grouped by feature in the order of the list
+class FeatureExtractor:
+    def __init__(self, features, window, fs, method='fft', wavelet='haar'):
+        self.features = list(features)
+        self.window = window
+        self.fs = fs
+        self.method = method
+        self.wavelet = wavelet
+        
+        # the band indices only depend on the window and the sampling rate
+        self.band_features = [i for i in self.features if i in bands]
+        self.band_idx = [utils.get_idx(bands[i],window,fs) for i in self.band_features]
+        
+        # the DWT coefficients of a window depend on the samples before it, up to history samples
+        self.dwt_features = [dwt_feature(i) for i in self.features if dwt_feature(i) is not None]
+        self.history = 0
+        if len(self.dwt_features) > 0:
+            self.history = (2**max(i[1] for i in self.dwt_features)-1)*(len(wavelet_filters(wavelet)[0])-1)
+    
+    # names of the output columns, for a signal with the given number of channels
+    def columns(self, channels):
+        return ['%s_%d' % (i,j) for i in self.features for j in range(channels)]
+    
+    # position is the time of the first sample in the recording, only needed by the DWT features
+    def transform(self, filtered, out=None, workers=1, position=0):
+        channels = filtered.shape[1]
+        n_windows = max(filtered.shape[0]-self.window,0)
+        
+        # the channels are independent, so each one can go to its own worker
+        if workers > 1:
+            result = parallel.run_shared(extract_channel,filtered,(n_windows,len(self.features)*channels),
+                                         [(self,i,position) for i in range(channels)],workers)
+            if out is None:
+                return result
+            out[:] = result
+            return out
+        
+        if out is None:
+            out = np.empty((n_windows,len(self.features)*channels))
+        
+        # every feature is written straight into its own columns of the output
+        views = [out[:,k*channels:(k+1)*channels] for k in range(len(self.features))]
+        
+        band_views = []
+        dwt_views = []
+        for i, view in zip(self.features,views):
+            if i == 'linelength':
+                with ins.stage('features.linelength'): linelength(filtered,self.window,view)
+            if i == 'sumsquares':
+                with ins.stage('features.sumsquares'): sumsquares(filtered,self.window,view)
+            if i in bands: band_views.append(view)
+            if dwt_feature(i) is not None: dwt_views.append(view)
+        
+        # all the requested bands share a single pass over the signal
+        if len(band_views) > 0:
+            with ins.stage('features.bandpower'):
+                bandpowers(filtered,self.window,self.band_idx,self.fs,self.method,band_views)
+        
+        # and so do all the DWT levels
+        if len(dwt_views) > 0:
+            with ins.stage('features.dwt'):
+                dwt_energies(filtered,self.window,self.dwt_features,self.wavelet,dwt_views,position)
         
-        bandpower.append(np.sum(p1[freq_band[0]:freq_band[1],:],axis=0)/
-                         ((freq_band[1]-freq_band[0])**2))
+        return out
 
-    return np.array(bandpower)/(band_normalize)
+# extract the features of a single channel into its columns of the output, from a worker
+def extract_channel(task, filtered, out):
+    extractor, i, position = task
+    extractor.transform(filtered[:,i:i+1],out[:,i::filtered.shape[1]],position=position)
 
-def feature_extraction (features, filtered, valid_labels, fs, window):    
+def feature_extraction (features, filtered, valid_labels, fs, window, method='fft', workers=1, wavelet='haar'):    
     # all feature calculations must end up the same size
-    X = np.empty((len(valid_labels[window:]),0))
-    for i in features:
-        if i == 'linelength': X = np.concatenate((X,linelength(filtered,window)),axis=1)
-        if i == 'delta': X = np.concatenate((X,bandpower(filtered,window,utils.get_idx(delta_band,window,fs),fs)),axis=1)
-        if i == 'theta': X = np.concatenate((X,bandpower(filtered,window,utils.get_idx(theta_band,window,fs),fs)),axis=1)
-        if i == 'alpha': X = np.concatenate((X,bandpower(filtered,window,utils.get_idx(alpha_band,window,fs),fs)),axis=1)
-        if i == 'beta': X = np.concatenate((X,bandpower(filtered,window,utils.get_idx(beta_band,window,fs),fs)),axis=1)
-        if i == 'gamma': X = np.concatenate((X,bandpower(filtered,window,utils.get_idx(gamma_band,window,fs),fs)),axis=1)
+    X = FeatureExtractor(features,window,fs,method,wavelet).transform(filtered,workers=workers)
     
     # size of labels should be consistent with X.shape[0]
     y = valid_labels[window:]
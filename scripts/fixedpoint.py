@@ -0,0 +1,297 @@
+import math
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import features as fe
+import utils as utils
+
+# Model of the fixed-point datapath, FixedPoint(dataWidth.W, dataBP.BP) in Chisel
+# It is bit-accurate for the filters, linelength, sumsquares, normalization, PCA and SVM, but not for the
+# bandpower features: the FFT is not modelled bit by bit (see below), and a warning is raised when they are used
+# Values are int64 arrays holding the real value scaled by 2**bp
+# Like the hardware, every block keeps its products and sums at full precision, and only drops bits
+# when a result is stored in a wire or register of the data type. Right shifts always floor.
+# This is exact as long as dataWidth + dataBP <= 64 (the int64 arithmetic wraps like the hardware does),
+# the bandpower switches to Python integers when its sums of squares could need more than 64 bits
+#
+# Differences with the floating point reference in features.py/svm.py, these follow the Chisel blocks:
+# - linelength sums window-1 differences, i.e. the samples of the current window (lineLength.scala)
+# - sumsquares sums the squares of the last window-1 samples of the window (SumSquares.scala)
+# - the FFT is modelled as an exact FFT of the fixed-point input, with its output stored in the data type
+#   (the rounding inside the butterflies of FFT.scala and of its twiddle factors is not modelled), so the
+#   bandpower features and the decisions that use them can differ from the hardware in the last bits
+# - the SVM kernel has no coef or gamma term (there is no sigmoid kernel), and the rbf kernel is the negative
+#   squared distance, without exp (svm.scala)
+
+# number of windows per batch for the bandpower and samples per batch for the SVM, bounds the memory usage
+block = 4096
+
+# Conversion of floating point values to fixed-point integers, the only one of the scripts: the model, the C
+# tables (ctables.py) and the C arrays of experimental/printers.py all round to the nearest value this way
+def scale(x, bp):
+    return np.round(np.asarray(x,dtype=float) * 2.0**bp)
+
+# keep the low width bits of an integer value, as signed, int64 arithmetic already wraps at 64 bits
+def wrap(q, width):
+    if width >= 64:
+        return q
+    half = 1 << (width-1)
+    return ((q + half) & ((1 << width)-1)) - half
+
+# values as the integers of a width/bp format, wrapped to width bits (up to 64, unlike FixedPointFormat)
+def quantize(x, width, bp):
+    return wrap(scale(x,bp).astype(np.int64),width)
+
+class FixedPointFormat:
+    # rounding: 'floor' (the hardware just drops the bits), 'half_up' or 'half_even'
+    # overflow: 'wrap' (the hardware keeps the low bits) or 'saturate'
+    def __init__(self, width=32, bp=8, rounding='floor', overflow='wrap'):
+        if rounding not in ['floor', 'half_up', 'half_even']:
+            raise ValueError("Unknown rounding mode '%s', use 'floor', 'half_up' or 'half_even'" % rounding)
+        if overflow not in ['wrap', 'saturate']:
+            raise ValueError("Unknown overflow mode '%s', use 'wrap' or 'saturate'" % overflow)
+        if width + bp > 64:
+            raise ValueError("Width %d with %d fractional bits does not fit in 64-bit products" % (width, bp))
+        self.width = width
+        self.bp = bp
+        self.rounding = rounding
+        self.overflow = overflow
+
+    # inputs and constants are converted with rounding to the nearest value
+    def quantize(self, x):
+        scaled = scale(x,self.bp)
+        return self.fit(scaled.astype(np.int64),scaled)
+
+    def to_float(self, q):
+        return q / 2.0**self.bp
+
+    # store a full precision value with shift extra fractional bits into the data type
+    # estimate is the same value computed in floating point, only used to detect overflow when saturating
+    def store(self, q, shift=0, estimate=None):
+        if (self.overflow == 'saturate') and (estimate is None):
+            estimate = q.astype(float)
+        if shift > 0:
+            if self.rounding == 'floor':
+                q = q >> shift
+            elif self.rounding == 'half_up':
+                q = (q + (1 << (shift-1))) >> shift
+            else:
+                floor = q >> shift
+                remainder = q - (floor << shift)
+                half = 1 << (shift-1)
+                q = floor + ((remainder > half) | ((remainder == half) & (floor % 2 == 1)))
+            if estimate is not None:
+                estimate = estimate / 2.0**shift
+        return self.fit(q,estimate)
+
+    # store a floating point value, already scaled by 2**bp, into the data type
+    def store_float(self, scaled):
+        if self.rounding == 'floor':
+            rounded = np.floor(scaled)
+        elif self.rounding == 'half_up':
+            rounded = np.floor(scaled + 0.5)
+        else:
+            rounded = np.round(scaled)
+        # keep the float out of the int64 range, the estimate takes care of saturation
+        return self.fit(np.clip(rounded,-2.0**62,2.0**62).astype(np.int64),rounded)
+
+    # fit an integer value in the data width
+    def fit(self, q, estimate=None):
+        if self.overflow == 'wrap':
+            return wrap(q,self.width)
+        half = 1 << (self.width-1)
+        q = np.clip(q,-half,half-1)
+        if estimate is not None:
+            # the int64 value itself might have wrapped
+            q = np.where(estimate >= half,half-1,np.where(estimate < -half,-half,q))
+        return q
+
+    def saturating(self):
+        return self.overflow == 'saturate'
+
+# the format used by the Scala testers
+def load_format(filename="generated_files/datasize.csv", rounding='floor', overflow='wrap'):
+    width, bp = np.loadtxt(filename,delimiter=',',dtype=int).ravel()
+    return FixedPointFormat(width,bp,rounding,overflow)
+
+def log2_exact(value, name):
+    if (value < 1) or (value & (value-1) != 0):
+        raise ValueError("%s must be a power of 2, currently %d" % (name, value))
+    return int(math.log2(value))
+
+#########################################
+# Datapath blocks, all data is quantized with fmt
+#########################################
+
+# FIR filter, the sum of products is stored once at the output (FIRFilter.scala)
+def fir(fmt, x, taps):
+    full = np.empty((x.shape[0]-len(taps)+1,x.shape[1]),dtype=np.int64)
+    for i in range(x.shape[1]):
+        full[:,i] = np.convolve(x[:,i],taps,mode='valid')
+
+    estimate = None
+    if fmt.saturating():
+        estimate = np.stack([np.convolve(x[:,i].astype(float),taps.astype(float),mode='valid')
+                             for i in range(x.shape[1])],axis=1)
+    return fmt.store(full,fmt.bp,estimate)
+
+# Cascade of direct form II sections (IIRFilter.scala), consts_A and consts_B have one row per section
+# as returned by utils.iir_coefficients. In every section, the sum of the input and the feedback products
+# is stored in the delay line (topLine), and the sum of the feedforward products is stored at the output.
+# The recursion runs sample by sample, over all channels at once
+def iir(fmt, x, consts_A, consts_B):
+    for A, B in zip(consts_A,consts_B):
+        regs = np.zeros((len(A),x.shape[1]),dtype=np.int64)
+        y = np.empty(x.shape,dtype=np.int64)
+        for n in range(x.shape[0]):
+            # the input is aligned to the binary point of the products
+            full = (x[n] << fmt.bp) + np.matmul(A,regs)
+            estimate = x[n]*2.0**fmt.bp + np.matmul(A.astype(float),regs) if fmt.saturating() else None
+            top = fmt.store(full,fmt.bp,estimate)
+
+            full = B[0]*top + np.matmul(B[1:],regs)
+            estimate = B[0]*top.astype(float) + np.matmul(B[1:].astype(float),regs) if fmt.saturating() else None
+            y[n] = fmt.store(full,fmt.bp,estimate)
+
+            regs[1:] = regs[:-1]
+            regs[0] = top
+        x = y
+    return x
+
+# line length over the window-1 differences of each window (lineLength.scala)
+def linelength(fmt, filtered, window):
+    log2_exact(window,'Window size')
+    # the differences are stored in the data type, the accumulator is full precision
+    datalength = fmt.store(np.abs(np.diff(filtered,axis=0)))
+    prefix = np.concatenate((np.zeros((1,filtered.shape[1]),dtype=np.int64),np.cumsum(datalength,axis=0)))
+
+    return fmt.store(fe.linelength_int(filtered,window,prefix=prefix))
+
+# sum of squares over the last window-1 samples of each window (SumSquares.scala)
+def sumsquares(fmt, filtered, window):
+    log2_exact(window,'Window size')
+    # every square is stored in the data type, the accumulator is full precision
+    estimate = filtered.astype(float)**2 if fmt.saturating() else None
+    squares = fmt.store(filtered*filtered,fmt.bp,estimate)
+    prefix = np.concatenate((np.zeros((1,filtered.shape[1]),dtype=np.int64),np.cumsum(squares,axis=0)))
+
+    return fmt.store(fe.sumsquares_int(filtered,window,prefix=prefix))
+
+# bandpower of a window of samples, from the stored FFT output (Bandpower.scala)
+def bandpower(fmt, filtered, window, freq_band):
+    shift = 2*log2_exact(freq_band[1]-freq_band[0],'Difference between the band indices') + int(math.log2(fe.band_normalize))
+    n_windows = max(filtered.shape[0]-window,0)
+    m = int(window/2)
+    bins = np.arange(freq_band[0],min(freq_band[1],m+1))
+    out = np.empty((n_windows,filtered.shape[1]),dtype=np.int64)
+
+    frames = sliding_window_view(filtered,window,axis=0)
+    for start in range(0,n_windows,block):
+        stop = min(start+block,n_windows)
+        spectrum = np.fft.rfft(frames[start:stop].astype(float),axis=2)
+        # only the bins of the band are needed
+        real = fmt.store_float(spectrum.real[:,:,bins])
+        imag = fmt.store_float(spectrum.imag[:,:,bins])
+        # except for DC and sampling freq, 2x for 2-sided to 1-sided
+        scale = np.where((bins >= 1) & (bins < m),2,1)
+
+        # the sum of squares can exceed int64 for wide formats, use Python integers then
+        peak = int(max(np.abs(real).max(initial=0),np.abs(imag).max(initial=0)))
+        if 4*peak*peak*len(bins) >= 2**63:
+            real = real.astype(object)
+            imag = imag.astype(object)
+        full = np.sum((real*real + imag*imag)*scale,axis=2)
+
+        estimate = None
+        if fmt.saturating():
+            estimate = np.floor(np.sum((real.astype(float)**2 + imag.astype(float)**2)*scale,axis=2)/2.0**shift)
+        out[start:stop] = fmt.store(full >> shift,fmt.bp,estimate)
+
+    return out
+
+# all the features, in the same column layout as features.FeatureExtractor
+def feature_extraction(fmt, features, filtered, fs, window):
+    if any(i in fe.bands for i in features):
+        warnings.warn("The fixed-point model is not bit-accurate for the bandpower features %s, the FFT "
+                      "rounding of the hardware is not modelled" % [i for i in features if i in fe.bands])
+    columns = []
+    for i in features:
+        if fe.dwt_feature(i) is not None:
+            raise ValueError("The fixed-point model does not cover the DWT features, currently %s" % i)
+        if i == 'linelength': columns.append(linelength(fmt,filtered,window))
+        if i == 'sumsquares': columns.append(sumsquares(fmt,filtered,window))
+        if i in fe.bands: columns.append(bandpower(fmt,filtered,window,utils.get_idx(fe.bands[i],window,fs)))
+    return np.concatenate(columns,axis=1)
+
+# (x - mean) * recip_std (pcaNormalizer.scala)
+def normalize(fmt, X, mean, recip_std):
+    full = (X - mean)*recip_std
+    estimate = (X.astype(float) - mean)*recip_std if fmt.saturating() else None
+    return fmt.store(full,fmt.bp,estimate)
+
+# dot product with every principal component (pca.scala)
+def pca(fmt, X, components):
+    estimate = np.matmul(X.astype(float),components.T.astype(float)) if fmt.saturating() else None
+    return fmt.store(np.matmul(X,components.T),fmt.bp,estimate)
+
+# the kernels of the hardware, with no gamma scaling (the linear kernel has none anyway)
+def check_kernel(kernel, gamma):
+    if kernel not in ['linear', 'poly', 'rbf']:
+        raise ValueError("The hardware has no %s kernel, use 'linear', 'poly' or 'rbf'" % kernel)
+    if (kernel != 'linear') and (gamma != 1):
+        raise ValueError("The hardware %s kernel has no gamma term, currently %f" % (kernel, gamma))
+
+# kernel and decision function of every classifier (svm.scala)
+def get_decision(fmt, X, kernel, degree, alpha_vector, supports, intercept, gamma=1):
+    check_kernel(kernel, gamma)
+    decision = np.empty((len(X),alpha_vector.shape[0]),dtype=np.int64)
+    for start in range(0,len(X),block):
+        X_block = X[start:start+block]
+        if kernel == 'rbf':
+            difference = supports.reshape((1,)+supports.shape) - X_block.reshape((len(X_block),1,X_block.shape[1]))
+            full = -np.sum(difference*difference,axis=2)
+            estimate = -np.sum(difference.astype(float)**2,axis=2) if fmt.saturating() else None
+            kernel_dotproduct = fmt.store(full,fmt.bp,estimate)
+        else:
+            estimate = np.matmul(X_block.astype(float),supports.T.astype(float)) if fmt.saturating() else None
+            linear = fmt.store(np.matmul(X_block,supports.T),fmt.bp,estimate)
+            kernel_dotproduct = linear
+            # multiply by itself n times for nth degree polynomial, storing every product
+            if kernel == 'poly':
+                for i in range(1,degree):
+                    estimate = kernel_dotproduct.astype(float)*linear if fmt.saturating() else None
+                    kernel_dotproduct = fmt.store(kernel_dotproduct*linear,fmt.bp,estimate)
+
+        # the intercept is aligned to the binary point of the products before the sum
+        full = np.matmul(kernel_dotproduct,alpha_vector.T) + (intercept << fmt.bp)
+        estimate = None
+        if fmt.saturating():
+            estimate = np.matmul(kernel_dotproduct.astype(float),alpha_vector.T.astype(float)) + intercept*2.0**fmt.bp
+        decision[start:start+len(X_block)] = fmt.store(full,fmt.bp,estimate)
+
+    return decision
+
+# The full datapath: FIR -> features -> normalization -> PCA -> SVM, all arguments are floating point
+# set mean/recip_std or components to None to skip normalization or PCA
+# with sos (scipy second order sections), the IIR filter replaces the FIR filter and lpf is not used
+# returns the decision values, converted back to floating point
+def datapath(fmt, X_raw, lpf, features, fs, window, mean, recip_std, components,
+             kernel, coef, degree, alpha_vector, supports, intercept, sos=None, gamma=1):
+    if coef != 0:
+        raise ValueError("The hardware polynomial kernel has no coef term, currently %f" % coef)
+    check_kernel(kernel, gamma)
+
+    if sos is None:
+        filtered = fir(fmt,fmt.quantize(X_raw),fmt.quantize(lpf))
+    else:
+        consts_A, consts_B = utils.iir_coefficients(sos)
+        filtered = iir(fmt,fmt.quantize(X_raw),fmt.quantize(consts_A),fmt.quantize(consts_B))
+    X = feature_extraction(fmt,features,filtered,fs,window)
+    if mean is not None:
+        X = normalize(fmt,X,fmt.quantize(mean),fmt.quantize(recip_std))
+    if components is not None:
+        X = pca(fmt,X,fmt.quantize(components))
+    decision = get_decision(fmt,X,kernel,degree,fmt.quantize(alpha_vector),fmt.quantize(supports),fmt.quantize(intercept),gamma)
+
+    return fmt.to_float(decision)
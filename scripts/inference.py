@@ -0,0 +1,114 @@
+import numpy as np
+
+import svm as svm
+
+# Compiled inference of the model, from the features to the SVM decision
+# The normalization (x - mean)/sqrt(var) and the PCA projection are combined into one affine map when the
+# model is built, and a linear kernel is folded into it as well (see svm.linear_model), so the decision of a
+# linear SVM is a single matvec on the features
+# Samples are processed in blocks that fit in the cache, through buffers that are allocated once,
+# so a stream of small chunks (e.g. real-time monitoring) does not allocate temporaries for every step
+
+# bytes of the working buffers of a block, about the size of a L2 cache
+cache_bytes = 2**18
+
+class InferenceModel:
+    # set mean/var or components to None to skip normalization or PCA, same as stream.pipeline
+    # block is the number of samples per block, by default as many as fit in cache_bytes
+    def __init__(self, mean, var, components, kernel, coef, degree, alpha_vector, supports, intercept,
+                 num_classifiers, gamma=1, block=None):
+        self.kernel = kernel
+        self.coef = coef
+        self.degree = degree
+        self.gamma = gamma
+        self.num_classifiers = num_classifiers
+
+        # affine map to the reduced features z = x.projection + shift
+        n_features = len(mean) if mean is not None else components.shape[1] if components is not None else supports.shape[1]
+        projection = np.eye(n_features) if components is None else components.T.copy()
+        shift = np.zeros(projection.shape[1])
+        if mean is not None:
+            projection *= (1/np.sqrt(var)).reshape((-1,1))
+            shift -= np.matmul(mean,projection)
+        self.projection = projection
+        self.shift = shift
+
+        linear = svm.linear_model(kernel, coef, degree, alpha_vector, supports, intercept, gamma)
+        if linear is not None:
+            # the whole model is one affine map, from the features straight to the decision
+            weights, bias = linear
+            self.weights = np.matmul(projection,weights.T)
+            self.bias = np.matmul(shift,weights.T) + bias
+        else:
+            self.weights = None
+            self.supports_T = np.ascontiguousarray(supports.T)
+            self.alpha_T = np.ascontiguousarray(alpha_vector.T)
+            self.bias = np.asarray(intercept,dtype=float)
+            if kernel == 'rbf':
+                self.support_norms = np.sum(supports ** 2,axis=1)
+
+        n_supports = 0 if linear is not None else len(supports)
+        if block is None:
+            block = max(cache_bytes//(8*(projection.shape[1] + n_supports + num_classifiers)),1)
+        self.block = block
+        self.reduced_buffer = np.empty((block,projection.shape[1]))
+        self.kernel_buffer = None if linear is not None else np.empty((block,n_supports))
+        self.norm_buffer = np.empty(block) if kernel == 'rbf' else None
+
+    # reduced features (normalized and projected) of a block, in the reduced buffer
+    def reduce(self, X):
+        z = self.reduced_buffer[:len(X)]
+        np.matmul(X,self.projection,out=z)
+        z += self.shift
+        return z
+
+    # kernel between a block of reduced features and the supports, (samples x supports) in the kernel buffer
+    def kernel_block(self, z):
+        k = self.kernel_buffer[:len(z)]
+        np.matmul(z,self.supports_T,out=k)
+        if self.kernel == 'poly':
+            if self.gamma != 1: k *= self.gamma
+            if self.coef != 0: k += self.coef
+            np.power(k,self.degree,out=k)
+        elif self.kernel == 'rbf':
+            # |s|^2 + |z|^2 - 2 s.z
+            norms = self.norm_buffer[:len(z)]
+            np.einsum('ij,ij->i',z,z,out=norms)
+            k *= -2
+            k += norms.reshape((-1,1))
+            k += self.support_norms
+            np.maximum(k,0,out=k)
+            k *= -self.gamma
+            np.exp(k,out=k)
+        elif self.kernel == 'sigmoid':
+            k *= self.gamma
+            k += self.coef
+            np.tanh(k,out=k)
+        return k
+
+    # decision of every sample of X (samples x features), same as get_decision after normalization and PCA
+    # out (samples x classifiers) and reduced (samples x dimensions) can be given to write the results in place
+    def decision_function(self, X, out=None, reduced=None):
+        if out is None:
+            out = np.empty((len(X),self.num_classifiers))
+        for start in range(0,len(X),self.block):
+            X_block = X[start:start+self.block]
+            decision = out[start:start+len(X_block)]
+            if (self.weights is None) or (reduced is not None):
+                z = self.reduce(X_block)
+                if reduced is not None: reduced[start:start+len(X_block)] = z
+            if self.weights is not None:
+                np.matmul(X_block,self.weights,out=decision)
+            else:
+                np.matmul(self.kernel_block(z),self.alpha_T,out=decision)
+            decision += self.bias
+        return out
+
+    # decisions of a stream of (features, labels) chunks, yields (reduced features, decision, vote, labels)
+    # this is the last stage of stream.pipeline
+    def decision_stream(self, chunks):
+        for X, y in chunks:
+            reduced = np.empty((len(X),self.projection.shape[1]))
+            decision = self.decision_function(X,reduced=reduced)
+            vote = np.ndarray.tolist((decision > 0).astype(int))
+            yield reduced, decision, vote, y
@@ -0,0 +1,177 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+import numpy as np
+
+# Per-stage instrumentation of the pipeline
+# A stage is timed by wrapping it:
+#   with ins.stage('filtering') as s:
+#       filtered = ...
+#       s.shapes(filtered)
+# and records its wall time, CPU time, the shapes of its outputs, and optionally the bytes it retained and its
+# peak memory (tracemalloc) and a cProfile of its calls. Stages of the same name add up, e.g. a stage run per chunk,
+# and stages can be nested (the time of the inner ones also counts in the outer one).
+# With enabled = 0, stage() hands back one shared object that does nothing, so the hooks cost next to nothing
+
+# set to 1 to record the stages
+enabled = 0
+# also trace the memory (bytes retained and peak per stage), which slows the stages down
+# retained is the growth of the traced memory from the start to the end of the stage (0 if it shrank), i.e. what
+# the stage left allocated, not the total it allocated: temporaries freed within the stage only show in the peak
+trace_memory = 0
+# also profile the calls of every stage with cProfile, the stats are kept per stage
+profile = 0
+
+# records by stage name, in the order the stages first ran
+records = {}
+# stages running right now, the innermost last
+active = []
+
+class Record:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.retained = 0
+        self.peak = 0
+        self.output_shapes = []
+        self.profiler = None
+        # False if the stage ever ran inside another one, the total only adds up the outermost stages
+        self.top = True
+
+def get_record(name):
+    if name not in records:
+        records[name] = Record(name)
+    return records[name]
+
+class Stage:
+    def __init__(self, name):
+        self.record = get_record(name)
+
+    def __enter__(self):
+        if trace_memory == 1:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # the peak is reset for this stage, the enclosing stages keep the peak so far
+            current, peak = tracemalloc.get_traced_memory()
+            for i in active:
+                i.peak_so_far = max(i.peak_so_far,peak)
+            tracemalloc.reset_peak()
+            self.memory = current
+            self.peak_so_far = current
+        # only one profiler can run at a time, the calls of nested stages count in the outermost one
+        self.profiling = (profile == 1) and all(not i.profiling for i in active)
+        if self.profiling:
+            if self.record.profiler is None:
+                self.record.profiler = cProfile.Profile()
+            self.record.profiler.enable()
+        if len(active) > 0:
+            self.record.top = False
+        active.append(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        active.pop()
+        if self.profiling:
+            self.record.profiler.disable()
+        record = self.record
+        record.calls += 1
+        record.wall += wall
+        record.cpu += cpu
+        if trace_memory == 1:
+            current, peak = tracemalloc.get_traced_memory()
+            record.retained += max(current - self.memory,0)
+            record.peak = max(record.peak,max(peak,self.peak_so_far) - self.memory)
+        return False
+
+    # shapes of the outputs of the stage, the latest call wins
+    def shapes(self, *arrays):
+        self.record.output_shapes = [tuple(np.shape(i)) for i in arrays]
+
+# the stage that does nothing, when the instrumentation is off
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def shapes(self, *arrays):
+        pass
+
+null_stage = NullStage()
+
+def stage(name):
+    if enabled == 0:
+        return null_stage
+    return Stage(name)
+
+# wrap a function in a stage of its own name (or the given one)
+# the shapes of its output are recorded, for an array or a list, or the arrays and lists of a tuple
+def instrumented(function, name=None):
+    name = name or function.__name__
+    def wrapper(*args, **kwargs):
+        with stage(name) as s:
+            result = function(*args, **kwargs)
+            if isinstance(result,tuple):
+                s.shapes(*[i for i in result if isinstance(i,(np.ndarray,list))])
+            elif isinstance(result,(np.ndarray,list)):
+                s.shapes(result)
+        return result
+    return wrapper
+
+def reset():
+    records.clear()
+
+# The records of a worker process (see parallel.run), to be sent back and merged into the records of the parent
+# the stages of the workers add up like stages run one after the other, and do not count in the total since
+# they run inside a stage of the parent; the cProfile stats of the workers are not sent back
+def export_records():
+    return [(i.name, i.calls, i.wall, i.cpu, i.retained, i.peak, i.output_shapes) for i in records.values()]
+
+def merge(exported):
+    for name, calls, wall, cpu, retained, peak, output_shapes in exported:
+        record = get_record(name)
+        record.calls += calls
+        record.wall += wall
+        record.cpu += cpu
+        record.retained += retained
+        record.peak = max(record.peak,peak)
+        record.output_shapes = output_shapes
+        if len(active) > 0:
+            record.top = False
+
+def report():
+    if len(records) == 0:
+        return
+    print("%-28s %6s %10s %10s %13s %12s  %s" % ('stage', 'calls', 'wall (s)', 'cpu (s)', 'retained (MB)', 'peak (MB)', 'shapes'))
+    for record in records.values():
+        memory = ('%13.1f %12.1f' % (record.retained/2**20, record.peak/2**20)) if trace_memory == 1 else '%13s %12s' % ('-','-')
+        print("%-28s %6d %10.4f %10.4f %s  %s" % (record.name, record.calls, record.wall, record.cpu, memory,
+                                                   ' '.join(str(i) for i in record.output_shapes)))
+    top = [i for i in records.values() if i.top]
+    print("%-28s %6s %10.4f %10.4f" % ('total', '', sum(i.wall for i in top), sum(i.cpu for i in top)))
+
+# the functions taking the most cumulative time within a stage, as printed by pstats
+def profile_report(name, count=10):
+    stream = io.StringIO()
+    pstats.Stats(records[name].profiler,stream=stream).sort_stats('cumulative').print_stats(count)
+    return stream.getvalue()
+
+# write the records to a JSON file, and the cProfile stats of every stage next to it (<name>.prof)
+def dump(filename):
+    with open(filename,'w') as f:
+        json.dump([{'stage': i.name, 'calls': i.calls, 'wall': i.wall, 'cpu': i.cpu, 'retained': i.retained,
+                    'peak': i.peak, 'shapes': i.output_shapes} for i in records.values()],f,indent=2)
+    for record in records.values():
+        if record.profiler is not None:
+            record.profiler.dump_stats(os.path.splitext(filename)[0] + '_%s.prof' % record.name)
@@ -0,0 +1,76 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+import instrument as ins
+
+# Helpers to fan out independent work (per pair, per channel) over a pool of processes
+# Large results are written by the workers straight into arrays in shared memory
+# Workers are forked, since top.py is a plain script that must not be re-executed by the children
+
+# create a float array in shared memory, returns the handle and the array
+def shared_array(shape):
+    shm = shared_memory.SharedMemory(create=True,size=max(int(np.prod(shape))*8,1))
+    return shm, np.ndarray(shape,dtype=float,buffer=shm.buf)
+
+# copy an array into shared memory, so that the workers can read it
+def to_shared(array):
+    shm, shared = shared_array(array.shape)
+    shared[:] = array
+    return shm, shared
+
+# attach to a shared array from a worker, the handle must be kept alive while the array is used
+def attach(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape,dtype=float,buffer=shm.buf)
+
+# release shared arrays, every array pointing to them must have been deleted by then
+def free(*shms):
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+# apply func to every task on a pool of workers, the results come back in the order of the tasks
+# with the instrumentation on, the stages run by the workers are merged into the records of the parent
+def run(func, tasks, workers):
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        if ins.enabled == 0:
+            return pool.map(func, tasks)
+        results = pool.map(instrumented_task, [(func, i) for i in tasks])
+    for result, exported in results:
+        ins.merge(exported)
+    return [i[0] for i in results]
+
+def instrumented_task(args):
+    func, task = args
+    # a forked worker starts with a copy of the records and running stages of the parent
+    ins.reset()
+    del ins.active[:]
+    result = func(task)
+    return result, ins.export_records()
+
+# apply func(task, X, out) to every task on a pool of workers
+# X is copied to shared memory and out (of shape out_shape) is filled in place by the workers
+# each task must write to its own part of out, so the result does not depend on the scheduling
+def run_shared(func, X, out_shape, tasks, workers):
+    shm_in, shared_in = to_shared(X)
+    shm_out, shared_out = shared_array(out_shape)
+    # the segments are released even if a worker raises, the views must go before they are closed
+    try:
+        run(shared_task, [(func, shm_in.name, X.shape, shm_out.name, out_shape, i) for i in tasks], workers)
+        out = np.array(shared_out)
+    finally:
+        del shared_in, shared_out
+        free(shm_in, shm_out)
+    return out
+
+def shared_task(args):
+    func, in_name, in_shape, out_name, out_shape, task = args
+    shm_in, X = attach(in_name, in_shape)
+    shm_out, out = attach(out_name, out_shape)
+    try:
+        func(task, X, out)
+    finally:
+        del X, out
+        shm_in.close()
+        shm_out.close()
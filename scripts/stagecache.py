@@ -0,0 +1,87 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+
+# Content-addressed on-disk cache for the outputs of the pipeline stages in top.py
+# An entry is keyed by a hash of the stage name, its parameters and the keys of the stages it reads from,
+# so changing a knob only invalidates the stages after it, and an unchanged prefix is read back from disk
+# The source files are identified by path, size and modification time, and the code of a stage by the
+# contents of its module, so editing e.g. features.py invalidates the features but not the filtering
+# Entries are directories of .npy files, the least recently used ones are evicted beyond max_size bytes
+
+cache_dir = '../data/cache/stages'
+# set to 0 to always recompute, the keys are still computed
+enabled = 1
+# maximum total size of the entries in bytes
+max_size = 2**32
+
+# hash of any mix of parameters (through repr) and arrays (through their contents)
+def key(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        if isinstance(part,np.ndarray):
+            h.update(repr((part.dtype.str, part.shape)).encode())
+            h.update(np.ascontiguousarray(part))
+        else:
+            h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+# identity of a source file, without reading it
+def file_key(filename):
+    stat = os.stat(filename)
+    return key(os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+# identity of the code of a module
+def module_key(module):
+    with open(module.__file__,'rb') as f:
+        return key(f.read())
+
+# Return the outputs of func() (a tuple of arrays), read from the entry of the key if there is one
+# the arrays read back are copy-on-write memory maps, modifying them never touches the cache
+def cached(stage_key, func):
+    if enabled == 0:
+        return func()
+
+    path = os.path.join(cache_dir,stage_key)
+    if os.path.isdir(path):
+        # mark as the most recently used
+        os.utime(path)
+        return tuple(np.load(os.path.join(path,'%d.npy' % i),mmap_mode='c') for i in range(len(os.listdir(path))))
+
+    outputs = tuple(func())
+    # write to a temporary directory first, so that an interrupted run never leaves a partial entry
+    os.makedirs(cache_dir,exist_ok=True)
+    temporary = path + '.tmp%d' % os.getpid()
+    os.makedirs(temporary,exist_ok=True)
+    for i, output in enumerate(outputs):
+        np.save(os.path.join(temporary,'%d.npy' % i),np.asarray(output))
+    try:
+        os.rename(temporary,path)
+    except OSError:
+        # another process stored the same entry in the meantime
+        shutil.rmtree(temporary)
+
+    evict(keep=path)
+    return outputs
+
+def entry_size(path):
+    return sum(os.path.getsize(os.path.join(path,i)) for i in os.listdir(path))
+
+# remove the least recently used entries until the cache fits in max_size, except keep
+def evict(keep=None):
+    entries = [os.path.join(cache_dir,i) for i in os.listdir(cache_dir) if '.tmp' not in i]
+    entries = sorted(entries,key=lambda i: os.stat(i).st_mtime)
+    sizes = dict((i, entry_size(i)) for i in entries)
+    total = sum(sizes.values())
+    for i in entries:
+        if total <= max_size:
+            break
+        if i == keep:
+            continue
+        shutil.rmtree(i,ignore_errors=True)
+        total -= sizes[i]
+
+def clear():
+    shutil.rmtree(cache_dir,ignore_errors=True)
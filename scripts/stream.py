@@ -0,0 +1,123 @@
+import math
+import numpy as np
+
+import utils as utils
+import inference as inference
+
+# Streaming version of the test flow in top.py, for recordings that do not fit in memory
+# Every stage is a generator of (data, labels) chunks, and carries over just enough samples
+# from the previous chunk so that the output is the same as the batch path
+# Labels are optional, pass None for live data where they are not known
+
+# number of characters read from a CSV file at a time
+read_block = 2**16
+
+# Stream the values of a CSV file in chunks of chunk_size, regardless of the row/column layout
+def read_values(filename, chunk_size):
+    buffered = np.empty(0)
+    tail = ''
+    with open(filename) as csvfile:
+        while True:
+            text = csvfile.read(read_block)
+            if text == '':
+                break
+            tokens = (tail + text).replace('\n',',').split(',')
+            # the last token might continue in the next block
+            tail = tokens.pop()
+            values = np.array([i for i in tokens if i.strip() != ''],dtype=float)
+            buffered = np.concatenate((buffered,values))
+
+            while len(buffered) >= chunk_size:
+                yield buffered[:chunk_size]
+                buffered = buffered[chunk_size:]
+
+    if tail.strip() != '':
+        buffered = np.concatenate((buffered,[float(tail)]))
+    if len(buffered) > 0:
+        yield buffered
+
+# Chunked reader for the dataset, the pairs are streamed one after the other as in utils.load_dataset
+# there is no class balancing here, since that needs the whole recording
+# every channel file must hold as many samples as the labels
+def read_chunks(pair_num, channel_num, chunk_size):
+    for pair in pair_num:
+        filenames = [utils.channel_file(i,pair) for i in channel_num]
+        channels = [read_values(i,chunk_size) for i in filenames]
+        for y in read_values(utils.label_file(pair),chunk_size):
+            x = [next(i,None) for i in channels]
+            for values, filename in zip(x,filenames):
+                if (values is None) or (len(values) != len(y)):
+                    raise ValueError("%s has fewer samples than %s" % (filename,utils.label_file(pair)))
+            yield np.stack(x,axis=1), y.reshape((len(y),1))
+
+# Chunks of an array that is already in memory, this is also how a live source should look like
+def array_chunks(X, y, chunk_size):
+    for i in range(0,X.shape[0],chunk_size):
+        yield X[i:i+chunk_size], (None if y is None else y[i:i+chunk_size])
+
+# keeps the last samples of a chunk (data and labels) to be prepended to the next one
+def carry_over(x, y, carry, keep):
+    if carry is not None:
+        x = np.concatenate((carry[0],x))
+        if y is not None: y = np.concatenate((carry[1],y))
+    keep = min(keep,x.shape[0])
+    return x, y, (x[x.shape[0]-keep:], None if y is None else y[len(y)-keep:])
+
+# FIR filter with the last numtaps-1 samples carried over, same as utils.data_filtering
+# method picks the filtering backend of every chunk, see utils.fir
+def fir_stream(chunks, lpf, method='auto'):
+    carry = None
+    delay = math.floor(len(lpf)/2)
+    for x, y in chunks:
+        x, y, carry = carry_over(x,y,carry,len(lpf)-1)
+        n = x.shape[0]-len(lpf)+1
+        if n <= 0:
+            continue
+
+        filtered = utils.fir(x,lpf,method)
+
+        # valid labels to match the 'valid' convolution
+        yield filtered, (None if y is None else y[delay:delay+n,0])
+
+# IIR filter with the state of every section carried over, same as utils.iir_filtering
+def iir_stream(chunks, sos):
+    state = None
+    for x, y in chunks:
+        filtered, state = utils.iir(x,sos,state)
+        yield filtered, (None if y is None else y[:,0])
+
+# Feature extraction with the last window samples carried over, same as features.feature_extraction
+# the DWT features also need the history of the window, the windows of that history are not output again
+def feature_stream(chunks, extractor):
+    carry = None
+    keep = extractor.window + extractor.history
+    seen = 0
+    for filtered, y in chunks:
+        new = filtered.shape[0]
+        filtered, y, carry = carry_over(filtered,y,carry,keep)
+        # time of the first sample of this block, and number of its windows that were already output
+        position = seen + new - filtered.shape[0]
+        skip = max(seen-extractor.window-position,0)
+        seen += new
+        n = filtered.shape[0]-extractor.window
+        if n-skip <= 0:
+            continue
+
+        X = extractor.transform(filtered,position=position)[skip:]
+        yield X, (None if y is None else y[extractor.window+skip:extractor.window+n])
+
+# The whole chain: FIR (or IIR) filter -> features -> normalization -> PCA -> SVM decision
+# chunks is any iterable of (raw samples, labels), e.g. read_chunks, array_chunks or a live source
+# set mean/var or components to None to skip normalization or PCA
+# with sos (scipy second order sections), the IIR filter replaces the FIR filter and lpf is not used
+def pipeline(chunks, lpf, extractor, mean, var, components,
+             kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers, gamma=1, filter_method='auto', sos=None):
+    if sos is None:
+        chunks = fir_stream(chunks,lpf,filter_method)
+    else:
+        chunks = iir_stream(chunks,sos)
+    chunks = feature_stream(chunks,extractor)
+    # normalization, PCA and the SVM are fused, see inference.py
+    model = inference.InferenceModel(mean, var, components, kernel, coef, degree, alpha_vector, supports, intercept,
+                                     num_classifiers, gamma)
+    return model.decision_stream(chunks)
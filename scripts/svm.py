@@ -1,6 +1,24 @@
 import numpy as np
 import itertools as it
 
+from sklearn.svm import SVC
+from sklearn.multiclass import OneVsRestClassifier
+from sklearn.multiclass import OutputCodeClassifier
+
+# Create the (untrained) SVM classifier for the given classification type: ovr, ovo or ecoc
+# for more information, check out this link: http://scikit-learn.org/stable/modules/multiclass.html
+def create_classifier(class_type, kernel, gamma, coef, degree, max_iter, penalty):
+    if class_type == 'ovr':
+        return OneVsRestClassifier(SVC(kernel=kernel, gamma=gamma, coef0=coef, degree=degree, 
+                                       max_iter=max_iter, C=penalty, random_state =109))
+    elif class_type == 'ovo':
+        return SVC(kernel=kernel, gamma=gamma, coef0=coef, degree=degree, decision_function_shape='ovo',
+                   max_iter=max_iter, C=penalty, random_state =109) # SVC is ovo by default, contrary to documentation
+    elif class_type == 'ecoc':
+        return OutputCodeClassifier(SVC(kernel=kernel, gamma=gamma, coef0=coef, degree=degree, 
+                                        max_iter=max_iter, C=penalty, random_state =109), random_state=109)
+    raise ValueError("Unknown classifier type '%s', use 'ovr', 'ovo' or 'ecoc'" % class_type)
+
 def config_matrix(clf,class_type,classes):
     # one vs one classification creates pairwise combinations of all classes as classifier
     # we need to create a classifier map for these pairwise combinations
@@ -55,7 +73,8 @@ def config_matrix(clf,class_type,classes):
         # get initial values, at index 0
         alpha_vector[0,support_index[0]:support_index[1]] = clf.estimators_[0].dual_coef_
         supports = clf.estimators_[0].support_vectors_
-        intercept = clf.intercept_
+        # the intercept of every estimator (OneVsRestClassifier no longer has intercept_)
+        intercept = np.concatenate([clf.estimators_[i].intercept_ for i in range(classes)])
         
         # create the alpha vector and support vector list by iterating through the estimators
         for i in range(1,classes):
@@ -96,29 +115,51 @@ def config_matrix(clf,class_type,classes):
             
     return alpha_vector, supports, intercept, num_classifiers
 
-def get_decision(X_test, kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers):
-    # This is where the kernel goes
-    # Select the corresponding kernel calculation
+# number of test samples per block in get_decision, bounds the size of the kernel matrix
+kernel_block = 4096
+
+# kernel between every support vector and every test sample, (supports x samples)
+def kernel_matrix(supports, X_test, kernel, coef, degree, gamma=1):
     if kernel == 'poly':
         # polynomial kernel, varying degrees
         # if you want linear, set coef = 0, degree = 1
-        kernel_dotproduct = np.power((coef + np.matmul(supports,X_test.T)),degree) 
-    
-    elif kernel == 'rbf': # this is so tricky!
-        # rbf kernel
-        kernel_dotproduct = np.zeros((len(supports),len(X_test)))
-        for i in range(len(supports)): # loop for all support vectors
-            for j in range(len(X_test)): # loop for all test data samples
-                kernel_dotproduct[i,j] = np.exp(-sum((supports[i] - X_test[j]) ** 2))
-                
+        return np.power((coef + gamma*np.matmul(supports,X_test.T)),degree)
+    
+    elif kernel == 'rbf':
+        # rbf kernel, the squared distances are expanded as |s|^2 + |x|^2 - 2 s.x
+        distance = (np.sum(supports ** 2,axis=1).reshape((len(supports),1)) + 
+                    np.sum(X_test ** 2,axis=1).reshape((1,len(X_test))) - 
+                    2*np.matmul(supports,X_test.T))
+        # rounding can make the distance of nearly equal vectors slightly negative
+        np.maximum(distance,0,out=distance)
+        return np.exp(-gamma*distance)
+    
+    elif kernel == 'sigmoid':
+        return np.tanh(coef + gamma*np.matmul(supports,X_test.T))
+    
     else:
-        kernel_dotproduct = np.matmul(supports,X_test.T)
+        return np.matmul(supports,X_test.T)
+
+# kernel of every sample with every support vector, (samples x supports), computed in blocks of kernel_block
+# samples so that the temporaries stay small, the result is the only full size array
+def kernel_columns(supports, X, kernel, coef, degree, gamma=1):
+    columns = np.empty((len(X),len(supports)))
+    for start in range(0,len(X),kernel_block):
+        columns[start:start+kernel_block] = kernel_matrix(supports, X[start:start+kernel_block], kernel, coef, degree, gamma).T
+    return columns
+
+def get_decision(X_test, kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers, gamma=1):
+    decision = np.empty((len(X_test),num_classifiers))
     
-    # kernel_dotproduct will be computed given the test set and support vectors
-    decision = np.matmul(alpha_vector,kernel_dotproduct)
-    # add the intercept after doing the dot product with the alphas
-    decision = decision + np.matmul(intercept.reshape((num_classifiers,1)),np.ones((1,len(X_test.T[0]))))
-    decision = decision.T
+    # the test set is processed in blocks, so the kernel matrix never gets bigger than supports x kernel_block
+    for start in range(0,len(X_test),kernel_block):
+        X_block = X_test[start:start+kernel_block]
+        # This is where the kernel goes
+        kernel_dotproduct = kernel_matrix(supports, X_block, kernel, coef, degree, gamma)
+        # kernel_dotproduct will be computed given the test set and support vectors
+        # add the intercept after doing the dot product with the alphas
+        decision[start:start+len(X_block)] = (np.matmul(alpha_vector,kernel_dotproduct) + 
+                                              intercept.reshape((num_classifiers,1))).T
     
     # set votes to 0 or 1
     vote = decision > 0
@@ -127,7 +168,157 @@ def get_decision(X_test, kernel, coef, degree, alpha_vector, supports, intercept
     
     return decision, vote
 
+# A linear kernel, or a polynomial one of degree 1, makes every decision an affine function of the sample:
+# sum_i alpha_i (coef + gamma s_i.x) + b = (gamma sum_i alpha_i s_i).x + (b + coef sum_i alpha_i)
+# so the model compiles to one weight vector per classifier, and the cost no longer depends on the supports
+# returns (weights (classifiers x features), intercept), or None if the kernel is not linear
+def linear_model(kernel, coef, degree, alpha_vector, supports, intercept, gamma=1):
+    if kernel == 'linear':
+        return np.matmul(alpha_vector,supports), intercept
+    elif (kernel == 'poly') and (degree == 1):
+        return gamma*np.matmul(alpha_vector,supports), intercept + coef*np.sum(alpha_vector,axis=1)
+    return None
+
+# Fold the normalization ((x - mean)*scale) and the PCA projection in front of a linear model, so that
+# it applies directly to the features as they come out of the feature extraction
+def fold_model(weights, intercept, mean=None, scale=None, components=None):
+    if components is not None:
+        weights = np.matmul(weights,components)
+    if scale is not None:
+        weights = weights*scale
+    if mean is not None:
+        intercept = intercept - np.matmul(weights,mean)
+    return weights, intercept
+
+# same outputs as get_decision, for a compiled linear model
+def linear_decision(X_test, weights, intercept):
+    decision = np.matmul(X_test,weights.T) + intercept
+    vote = np.ndarray.tolist((decision > 0).astype(int))
+    return decision, vote
+
+# Reduce the model to a budget of size_limit support vectors, keeping the decision function as close as possible
+# the cost of the hardware is linear in the number of support vectors, methods:
+#   first:  the first size_limit support vectors, as they come out of config_matrix
+#   alpha:  the support vectors with the largest alphas (summed over the classifiers)
+#   greedy: forward selection, every step adds the support vector that best explains what is left of the
+#           decision function, and all the alphas are refitted (orthogonal matching pursuit)
+#   kmeans: the centers of size_limit clusters of the support vectors
+# except for first, the alphas and intercepts are then refitted by least squares to the full decision function,
+# sampled at X (e.g. the training set), or at the support vectors themselves
+# at most reduce_samples samples of X are used, evenly spaced, the kernel matrix of the fit is (samples x supports)
+reduce_samples = 8192
+
+def reduce_supports(alpha_vector, supports, intercept, size_limit, kernel, coef, degree, gamma=1, method='first', X=None):
+    if (size_limit is None) or (size_limit >= len(supports)):
+        return alpha_vector, supports, intercept
+    if method == 'first':
+        return alpha_vector[:,0:size_limit], supports[0:size_limit], intercept
+    
+    if X is None: X = supports
+    if len(X) > reduce_samples:
+        X = X[np.linspace(0,len(X)-1,reduce_samples).astype(int)]
+    # kernel of the samples with every support vector, computed once
+    columns = kernel_columns(supports, X, kernel, coef, degree, gamma)
+    # full decision function (without the intercept) at the sample points, (samples x classifiers)
+    target = np.matmul(columns,alpha_vector.T)
+    
+    if method == 'alpha':
+        reduced = supports[np.sort(np.argsort(-np.sum(np.abs(alpha_vector),axis=0),kind='stable')[0:size_limit])]
+    elif method == 'greedy':
+        norms = np.sum(columns ** 2,axis=0)
+        norms[norms == 0] = np.inf
+        selected = []
+        residual = target - target.mean(axis=0)
+        for i in range(size_limit):
+            # the candidate with the largest projection of the residual, over all the classifiers
+            score = np.sum(np.matmul(columns.T,residual) ** 2,axis=1)/norms
+            score[selected] = -1
+            selected.append(int(score.argmax()))
+            residual = target - refit(columns[:,selected],target)[1]
+        reduced = supports[np.sort(selected)]
+    elif method == 'kmeans':
+        from sklearn.cluster import KMeans
+        reduced = KMeans(n_clusters=size_limit, n_init=10, random_state=109).fit(supports).cluster_centers_
+    else:
+        raise ValueError("Unknown reduction method '%s', use 'first', 'alpha', 'greedy' or 'kmeans'" % method)
+    
+    (weights, offset), _ = refit(kernel_columns(reduced, X, kernel, coef, degree, gamma),target)
+    return weights.T, reduced, intercept + offset
+
+# least squares fit of the target with the columns and a constant, returns the (weights, constant) and the fit
+def refit(columns, target):
+    design = np.hstack((columns,np.ones((len(columns),1))))
+    solution = np.linalg.lstsq(design,target,rcond=None)[0]
+    return (solution[:-1], solution[-1]), np.matmul(design,solution)
+
+# Decision values of the library itself, in the same layout as get_decision
+# this is the regression check of the manual calculation, it only holds when every support vector is kept
+# (the SVC for ovo should be created with decision_function_shape='ovo' for more than 2 classes)
+def library_decision(X_test, clf, class_type):
+    if class_type == 'ovo':
+        return clf.decision_function(X_test).reshape((len(X_test),-1))
+    # ovr and ecoc have one estimator per classifier
+    return np.array([i.decision_function(X_test) for i in clf.estimators_]).T
+
+# Regression check of the manual decision (config_matrix and get_decision) against the library, on synthetic
+# clusters of samples, for every classification type with the poly and rbf kernels and all the support vectors kept
+# raises AssertionError if a decision differs by more than tolerance, returns the largest difference otherwise
+def check_decision(classes=3, samples=400, features=4, tolerance=1e-8):
+    rng = np.random.default_rng(109)
+    labels = np.arange(samples) % classes
+    X = rng.standard_normal((classes,features))[labels]*2 + rng.standard_normal((samples,features))
+    X_train, y_train, X_test = X[0:samples//2], labels[0:samples//2], X[samples//2:]
+    
+    largest = 0
+    for class_type in ['ovo', 'ovr', 'ecoc']:
+        for kernel, gamma, coef, degree in [('poly', 0.5, 1, 3), ('rbf', 0.2, 0, 3)]:
+            clf = create_classifier(class_type, kernel, gamma, coef, degree, -1, 1)
+            clf.fit(X_train, y_train)
+            alpha_vector, supports, intercept, num_classifiers = config_matrix(clf,class_type,classes)
+            decision, vote = get_decision(X_test, kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers, gamma)
+            difference = np.max(np.abs(decision - library_decision(X_test,clf,class_type)))
+            assert difference <= tolerance, ("Decision of %s %s differs from the library by %e" % (class_type, kernel, difference))
+            largest = max(largest,difference)
+    return largest
+
 def predict (X_test, clf, class_type, classes, num_classifiers, decision, vote):
+    # every test sample is a row, every classifier a column
+    vote = np.array(vote,dtype=int).reshape((len(decision),num_classifiers))
+    
+    if class_type == 'ovo':
+        class_pairs = np.array(list(it.combinations(list(range(classes)),2)))
+        # the class picked by each classifier, 1 must correspond to the first of the pair
+        # binary classification is a special case since that only has 1 classifier
+        if classes > 2:
+            picked = class_pairs[np.arange(num_classifiers),1-vote]
+        else:
+            picked = class_pairs[np.arange(num_classifiers),vote]
+        
+        # tally the votes per class, with the classes of each test sample offset into their own row
+        offset = classes*np.arange(len(vote)).reshape((len(vote),1))
+        tally = np.bincount((picked + offset).ravel(),minlength=len(vote)*classes).reshape((len(vote),classes))
+        # the class with the most votes wins, ties go to the lowest class
+        y_manual = tally.argmax(axis=1)
+    
+    elif class_type == 'ovr':
+        if classes != 2:    # classes has been updated to -1 earlier (determines the # of classifiers)
+            y_manual = decision.argmax(axis=1)  # ties go to the lowest class
+        else:
+            y_manual = decision[:,0] > 0    # special case for 2 classes
+    
+    elif class_type == 'ecoc':
+        # the distance is the sum of squares to every code, using the raw decision function value
+        # (instead of the euclidean distance, which needs a square root)
+        distance = np.sum((decision.reshape((len(decision),1,num_classifiers)) - 
+                           clf.code_book_.reshape((1,classes,num_classifiers))) ** 2,axis=2)
+        # pick the minimum distance, ties go to the lowest class
+        y_manual = distance.argmin(axis=1)
+    
+    return y_manual.reshape((len(vote),1)).astype(float)
+
+# Reference implementation of predict, one test sample and classifier at a time
+# this is kept to check and benchmark the vectorized version above (see benchmark_predict.py)
+def predict_reference (X_test, clf, class_type, classes, num_classifiers, decision, vote):
     # initialize container of final predicted classes using manual calculation
     y_manual = np.zeros((len(vote),1))
     
@@ -181,4 +372,8 @@ def predict (X_test, clf, class_type, classes, num_classifiers, decision, vote):
         # we'll cheat a bit lol, this gets the distance between the clamped values already
         #y_pred = euclidean_distances(vote,codes).argmin(axis=1)
         
-    return y_manual
\ No newline at end of file
+    return y_manual
+
+# python svm.py runs the regression check of the decision function
+if __name__ == '__main__':
+    print("Maximum difference from the library decision function: %e" % check_decision())
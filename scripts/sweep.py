@@ -0,0 +1,253 @@
+import itertools as it
+import numpy as np
+
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+import features as fe
+import utils as utils
+import svm as svm
+import classifiers as cl
+import fixedpoint as fxp
+import parallel as parallel
+
+# Design space sweep of the wellness datapath
+# Every configuration of a parameter grid goes through the same flow as top.py (without the handcrafted
+# test set), and is scored on accuracy, sensitivity and specificity against its hardware cost
+# The flow is split in stages, and every stage result is kept in memory, keyed by the parameters it
+# depends on, so e.g. the filtered signal is computed once for all the SVM and bit width settings
+
+# the parameters of a configuration, the names and defaults follow top.py
+defaults = {
+    'fs': 500,
+    'window': 512,
+    'numtaps': 6,
+    'cutoff': [0, 150, 200, 250],
+    'filter_method': 'auto',
+    'features': ['theta','alpha','linelength'],
+    'wavelet': 'haar',
+    'balance': 1,
+    'normalize': 1,
+    'do_pca': 1,
+    'dimensions': 1,
+    'classifier': 'svm',  # svm, logistic, nn or rf, see classifiers.py
+    'kernel': 'poly',
+    'degree': 1,
+    'coef': 0,
+    'gamma': 1,
+    'classes': 2,
+    'class_type': 'ovo',
+    'max_iter': 10000,
+    'penalty': 1,
+    'train_pair_num': [3],
+    'test_pair_num': [4,5,6],
+    'channel_num': [1],
+    'size_limit': None,   # number of support vectors to retain, None keeps them all
+    'size_method': 'first', # how they are picked, see svm.reduce_supports
+    'neurons': 4,         # neural net
+    'layers': 1,
+    'trees': 8,           # random forest
+    'depth': 3,
+    'dataWidth': None,    # fixed-point format of the datapath, None evaluates in floating point
+    'dataBP': None,
+}
+
+# the parameters every stage depends on, each stage also depends on everything before it
+stage_params = [
+    ('data', ['train_pair_num', 'test_pair_num', 'channel_num', 'balance']),
+    ('filter', ['fs', 'numtaps', 'cutoff', 'filter_method']),
+    ('features', ['features', 'window', 'wavelet']),
+    ('model', ['normalize', 'do_pca', 'dimensions', 'classifier', 'kernel', 'degree', 'coef', 'gamma',
+               'classes', 'class_type', 'max_iter', 'penalty', 'neurons', 'layers', 'trees', 'depth']),
+]
+
+# results of the stages, by (stage, key)
+cache = {}
+
+def stage_key(config, stage):
+    params = []
+    for name, names in stage_params:
+        params += names
+        if name == stage:
+            break
+    return (stage,) + tuple((i, repr(config[i])) for i in params)
+
+def stage_result(config, stage):
+    return cache[stage_key(config,stage)]
+
+#########################################
+# Stages, each one reads the results of the previous stage from the cache
+#########################################
+
+def data_stage(config):
+    X_train_raw, y_train_raw = utils.load_dataset(config['train_pair_num'],config['channel_num'],config['balance'])
+    X_test_raw, y_test_raw = utils.load_dataset(config['test_pair_num'],config['channel_num'],config['balance'])
+    return {'X_train_raw': X_train_raw, 'y_train_raw': y_train_raw, 'X_test_raw': X_test_raw, 'y_test_raw': y_test_raw}
+
+def filter_stage(config):
+    data = stage_result(config,'data')
+    lpf = utils.design_filter(config['numtaps'],config['cutoff'],config['fs'])
+    filtered_train, valid_labels_train = utils.data_filtering(data['X_train_raw'],data['y_train_raw'],lpf,method=config['filter_method'])
+    filtered_test, valid_labels_test = utils.data_filtering(data['X_test_raw'],data['y_test_raw'],lpf,method=config['filter_method'])
+    return {'lpf': lpf, 'filtered_train': filtered_train, 'valid_labels_train': valid_labels_train,
+            'filtered_test': filtered_test, 'valid_labels_test': valid_labels_test}
+
+def features_stage(config):
+    filtered = stage_result(config,'filter')
+    X_train, y_train = fe.feature_extraction(config['features'],filtered['filtered_train'],filtered['valid_labels_train'],
+                                             config['fs'],config['window'],wavelet=config['wavelet'])
+    X_test, y_test = fe.feature_extraction(config['features'],filtered['filtered_test'],filtered['valid_labels_test'],
+                                           config['fs'],config['window'],wavelet=config['wavelet'])
+    return {'X_train': X_train, 'y_train': y_train, 'X_test': X_test, 'y_test': y_test}
+
+def model_stage(config):
+    feature_set = stage_result(config,'features')
+    X_train = feature_set['X_train']
+    X_test = feature_set['X_test']
+
+    mean = None
+    var = None
+    if config['normalize'] == 1:
+        params = StandardScaler().fit(X_train)
+        mean = params.mean_
+        var = params.var_
+        X_train = (X_train - mean)/np.sqrt(var)
+        X_test = (X_test - mean)/np.sqrt(var)
+
+    components = None
+    if config['do_pca'] == 1:
+        components = PCA(n_components=config['dimensions']).fit(X_train).components_
+        X_train = np.matmul(X_train,components.T)
+        X_test = np.matmul(X_test,components.T)
+
+    if config['classifier'] != 'svm':
+        engine = cl.create(config['classifier'],config).fit(X_train,feature_set['y_train'])
+        return {'engine': engine, 'mean': mean, 'var': var, 'components': components, 'X_test': X_test}
+
+    clf = svm.create_classifier(config['class_type'],config['kernel'],config['gamma'],config['coef'],
+                                config['degree'],config['max_iter'],config['penalty'])
+    clf.fit(X_train,feature_set['y_train'])
+    alpha_vector, supports, intercept, num_classifiers = svm.config_matrix(clf,config['class_type'],config['classes'])
+
+    return {'clf': clf, 'mean': mean, 'var': var, 'components': components, 'X_train': X_train, 'X_test': X_test,
+            'alpha_vector': alpha_vector, 'supports': supports, 'intercept': intercept, 'num_classifiers': num_classifiers}
+
+stages = {'data': data_stage, 'filter': filter_stage, 'features': features_stage, 'model': model_stage}
+
+def stage_task(task):
+    stage, config = task
+    return stages[stage](config)
+
+# the last step, not cached since it is different for every configuration
+def evaluate(config):
+    model = stage_result(config,'model')
+    y_test = stage_result(config,'features')['y_test']
+
+    if config['classifier'] != 'svm':
+        if config['dataWidth'] is not None:
+            raise ValueError("The fixed-point datapath only models the SVM, not '%s'" % config['classifier'])
+        return score(config,model['engine'].predict(model['X_test']),y_test,0,model['engine'].cost()['parameters'])
+
+    alpha_vector, supports, intercept = svm.reduce_supports(model['alpha_vector'],model['supports'],model['intercept'],
+                                                            config['size_limit'],config['kernel'],config['coef'],
+                                                            config['degree'],config['gamma'],config['size_method'],
+                                                            model['X_train'])
+
+    linear = svm.linear_model(config['kernel'],config['coef'],config['degree'],alpha_vector,supports,intercept,config['gamma'])
+    if (config['dataWidth'] is None) and (linear is not None):
+        decision, vote = svm.linear_decision(model['X_test'],*linear)
+    elif config['dataWidth'] is None:
+        decision, vote = svm.get_decision(model['X_test'],config['kernel'],config['coef'],config['degree'],alpha_vector,
+                                          supports,intercept,model['num_classifiers'],config['gamma'])
+    else:
+        data = stage_result(config,'data')
+        decision = fxp.datapath(fxp.FixedPointFormat(config['dataWidth'],config['dataBP']),data['X_test_raw'],
+                                stage_result(config,'filter')['lpf'],config['features'],config['fs'],config['window'],
+                                model['mean'],None if model['var'] is None else 1/np.sqrt(model['var']),model['components'],
+                                config['kernel'],config['coef'],config['degree'],alpha_vector,supports,intercept,
+                                gamma=config['gamma'])
+        vote = np.ndarray.tolist((decision > 0).astype(int))
+
+    y_manual = svm.predict(model['X_test'],model['clf'],config['class_type'],config['classes'],
+                           model['num_classifiers'],decision,vote)[:,0]
+
+    return score(config,y_manual,y_test,supports.shape[0],supports.size + alpha_vector.size + len(intercept))
+
+def score(config, y_manual, y_test, supports, parameters):
+    return {'accuracy': np.mean(y_manual == y_test),
+            'sensitivity': np.sum((y_manual == y_test) & (y_test == 1))/np.sum(y_test == 1),
+            'specificity': np.sum((y_manual == y_test) & (y_test == 0))/np.sum(y_test == 0),
+            'taps': config['numtaps'],
+            'supports': supports,
+            'parameters': parameters,
+            'bits': 64 if config['dataWidth'] is None else config['dataWidth']}
+
+#########################################
+# Sweep
+#########################################
+
+# every combination of the grid (a dict of lists of values), on top of the base parameters
+def expand(grid, base=None):
+    configs = []
+    for values in it.product(*grid.values()):
+        config = dict(defaults)
+        config.update(base or {})
+        config.update(zip(grid.keys(),values))
+        configs.append(config)
+    return configs
+
+# evaluate every configuration of the grid, the stages are computed one after the other,
+# each one in parallel over its distinct settings, then all the configurations are evaluated in parallel
+def run(grid, base=None, workers=1):
+    configs = expand(grid,base)
+
+    for stage, names in stage_params:
+        todo = {}
+        for config in configs:
+            key = stage_key(config,stage)
+            if key not in cache: todo[key] = config
+
+        if (workers > 1) and (len(todo) > 1):
+            outputs = parallel.run(stage_task,[(stage,i) for i in todo.values()],workers)
+        else:
+            outputs = [stages[stage](i) for i in todo.values()]
+        cache.update(zip(todo.keys(),outputs))
+
+    if workers > 1:
+        scores = parallel.run(evaluate,configs,workers)
+    else:
+        scores = [evaluate(i) for i in configs]
+
+    # keep only the parameters that were swept next to the scores
+    results = [dict([(i, config[i]) for i in grid.keys()] + list(score.items())) for config, score in zip(configs,scores)]
+    for result, front in zip(results,pareto(results)):
+        result['pareto'] = front
+    return results
+
+# a result is on the Pareto front if no other result is at least as good in accuracy, sensitivity,
+# specificity and every hardware cost (taps, supports, parameters, bits), and strictly better in one of them
+def pareto(results):
+    scores = np.array([[i['accuracy'], i['sensitivity'], i['specificity'], -i['taps'], -i['supports'],
+                        -i['parameters'], -i['bits']]
+                       for i in results])
+    front = []
+    for score in scores:
+        dominated = np.any(np.all(scores >= score,axis=1) & np.any(scores > score,axis=1))
+        front.append(not dominated)
+    return front
+
+def print_table(results):
+    names = list(results[0].keys())
+    print(' '.join('%12s' % i for i in names))
+    for result in sorted(results,key=lambda i: (-i['pareto'], -i['accuracy'])):
+        print(' '.join('%12.4f' % result[i] if isinstance(result[i],float) else '%12s' % result[i] for i in names))
+
+if __name__ == '__main__':
+    # example sweep of the filter length, model size and bit width
+    grid = {
+        'numtaps': [6, 16],
+        'size_limit': [10, None],
+        'dataWidth': [16, 24, 32],
+        'dataBP': [8],
+    }
+    print_table(run(grid,workers=4))
@@ -4,14 +4,17 @@ import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score
-from sklearn.svm import SVC
-from sklearn.multiclass import OneVsRestClassifier
-from sklearn.multiclass import OutputCodeClassifier
-from scipy.signal import remez
 
 import features as fe
 import utils as utils
 import svm as svm
+import stream as st
+import inference as inference
+import fixedpoint as fxp
+import stagecache as stc
+import export as export
+import ctables as ctables
+import instrument as ins
 
 import warnings
 
@@ -29,20 +32,57 @@ window = 512 # 1 second
 numtaps = 6
 # low pass filter, allow 0-150 Hz, roll-off starting 150, minimum at 200-250 Hz
 cutoff = [0, 150, 200, 250]
+# filtering backend: auto (by tap count and length), direct, fft or overlap_save
+filter_method = 'auto'
+# conditioning filter type: fir (remez, numtaps) or iir (elliptic, cascade of second order sections, same band edges)
+filter_type = 'fir'
+# for the iir filter, maximum pass band ripple and minimum stop band attenuation in dB
+iir_ripple = 1
+iir_attenuation = 40
 
 # what features to calculate? check features.py for all possible list
+# (sumsquares is the time domain power of the window,
+#  dwt_d<level> and dwt_a<level> are the energies of the wavelet detail and approximation coefficients)
 features = ['theta','alpha','linelength']
+# wavelet of the DWT features: haar, db2, db4
+wavelet = 'haar'
 
-# are we loading the data again? might take a while
-load_data = 1 # you can turn this off if the script has run once
+# cache the loading, filtering and feature extraction on disk? only the stages after a changed parameter rerun
+stage_cache = 1
+# maximum size of the stage cache in bytes, the least recently used entries are evicted beyond that
+stage_cache_size = 2**32
 balance = 1 # to equalize number of seizure and nonseizure events
 # are we printing out the matrices to a file?
 print_data = 1
+# also write them as CSV files? they always go to the binary export generated_files/generated.bin, see export.py
+export_csv = 1
 # are we plotting the results?
 plot_data = 1
 
+# stream the test set through the chunked pipeline instead of keeping it all in memory?
+stream_test = 0
+# number of raw samples per chunk when streaming
+chunk_size = 2**16
+
+# number of processes for loading, filtering and feature extraction, 1 runs everything serially
+workers = 1
+
+# run the fixed-point model (format from generated_files/datasize.csv)?
+# it is bit-accurate except for the bandpower features, whose FFT rounding is not modelled (see fixedpoint.py)
+# its decisions are then written to expected.csv instead of the floating point ones
+fixed_point = 0
+# rounding when bits are dropped: floor (what the hardware does), half_up or half_even
+fixed_rounding = 'floor'
+# overflow handling: wrap (what the hardware does) or saturate
+fixed_overflow = 'wrap'
+
 # you want the script to be verbose or not?
 silence = 0
+# time every stage (wall and CPU time, output shapes) and print a report at the end?
+instrument = 0
+# also the memory retained and peak per stage (tracemalloc) and a cProfile of every stage? both slow the run down
+instrument_memory = 0
+instrument_profile = 0
 
 # should I do PCA or not?
 do_pca = 1
@@ -52,17 +92,19 @@ dimensions = 1
 # do we normalize the training and test data set?
 normalize = 1 # almost always that we have to normalize for proper training
 
-# set the kernel here: poly, rbf, linear is basically poly at degree 1
+# set the kernel here: poly, rbf, sigmoid, linear is basically poly at degree 1
 kernel = 'poly'
-# these are for the polynomial kernel only
+# these are for the polynomial kernel only (coef is also used by sigmoid)
 degree = 1
 coef = 0
+# kernel coefficient for poly, rbf and sigmoid
+gamma = 1
 # how many classes?
 classes = 2
 # set the classifier type: ovr, ovo, ecoc
 class_type = 'ovo'
 # maximum number of iterations for SVM training
-max_iter = 1e4
+max_iter = 10000
 # penalty term, higher = lesser number of support vectors = lesser accuracy
 penalty = 1
 
@@ -79,6 +121,8 @@ cheat_test = 1
 n_handcraft = 50
 # number of support vectors to retain
 size_limit = 10
+# how they are picked: 'first' (the first ones out of config_matrix), 'alpha', 'greedy' or 'kmeans', see svm.reduce_supports
+size_method = 'first'
 
 np.random.seed(1) # for reproducibility of results
 
@@ -89,28 +133,52 @@ if silence == 0: print("Using actual dataset with %d classes" % classes)
 
 if silence == 0: print("Loading training dataset")
 if silence == 0: print("Dataset has %d pair(s) of seizure/nonseizure points, with %d channel(s)" % (len(train_pair_num),len(channel_num)))
-if load_data == 1: X_train_raw, y_train_raw = utils.load_dataset(train_pair_num,channel_num,balance)
+stc.enabled = stage_cache
+stc.max_size = stage_cache_size
+ins.enabled = instrument
+ins.trace_memory = instrument_memory
+ins.profile = instrument_profile
+# the training set is only read if its features are not in the cache
+load_train = lambda: ins.instrumented(utils.load_dataset,'loading')(train_pair_num,channel_num,balance,workers=workers)
+train_key = stc.key('dataset',[stc.file_key(i) for i in utils.dataset_files(train_pair_num,channel_num)],balance)
 
 if silence == 0: print("Loading test dataset")
 if silence == 0: print("Dataset has %d pair(s) of seizure/nonseizure points, with %d channel(s)" % (len(test_pair_num),len(channel_num)))
-if load_data == 1: X_test_raw, y_test_raw = utils.load_dataset(test_pair_num,channel_num,balance)
+if stream_test == 0:
+    with ins.stage('loading') as s:
+        X_test_raw, y_test_raw = utils.load_dataset(test_pair_num,channel_num,balance,workers=workers)
+        s.shapes(X_test_raw, y_test_raw)
     
 #########################################
 # Signal conditioning filter design
 #########################################
 if silence == 0: print("Designing filter with %d taps" % numtaps)
 # Set filter specs
-lpf = remez(numtaps=numtaps, bands=cutoff, desired=[1.0, 0.0], Hz=fs)
+lpf_key = stc.key('design_filter',numtaps,cutoff,fs)
+lpf, = stc.cached(lpf_key, lambda: (ins.instrumented(utils.design_filter,'filter_design')(numtaps, cutoff, fs),))
+
+sos = None
+if filter_type == 'iir':
+    if silence == 0: print("Designing IIR filter with %d dB stop band attenuation" % iir_attenuation)
+    lpf_key = stc.key('design_iir_filter',cutoff,fs,iir_ripple,iir_attenuation)
+    sos, = stc.cached(lpf_key, lambda: (ins.instrumented(utils.design_iir_filter,'filter_design')(cutoff, fs, iir_ripple, iir_attenuation),))
+    if silence == 0: print("The IIR filter has %d second order sections" % sos.shape[0])
+
+# the filtering of a dataset, with either filter
+conditioning = lambda X, y: (ins.instrumented(utils.data_filtering,'filtering')(X, y, lpf, workers, filter_method) if sos is None else
+                             ins.instrumented(utils.iir_filtering,'filtering')(X, y, sos))
 
 #########################################
 # Data filtering and Feature extraction for Training data
 #########################################
 if silence == 0: print("Passing the dataset through the filter")
-filtered_train, valid_labels_train = utils.data_filtering(X_train_raw, y_train_raw, lpf)
+filter_train_key = stc.key('data_filtering',stc.module_key(utils),train_key,lpf_key,filter_method)
+filter_train = lambda: stc.cached(filter_train_key, lambda: conditioning(*load_train()))
 
 if silence == 0: print("Calculating features...")
 if silence == 0: print(features)
-X_train, y_train = fe.feature_extraction(features,filtered_train,valid_labels_train,fs,window)
+features_train_key = stc.key('feature_extraction',stc.module_key(fe),filter_train_key,features,fs,window,wavelet)
+X_train, y_train = stc.cached(features_train_key, lambda: ins.instrumented(fe.feature_extraction)(features,*filter_train(),fs,window,workers=workers,wavelet=wavelet))
 
 #########################################
 # Overrides for handcrafted test data, for demo
@@ -128,29 +196,36 @@ if cheat_test == 1:
 #########################################
 # Data filtering and Feature extraction for Test data
 #########################################
-filtered_test, valid_labels_test = utils.data_filtering(X_test_raw, y_test_raw, lpf)
-X_test, y_test = fe.feature_extraction(features,filtered_test,valid_labels_test,fs,window)
+# when streaming, this is done chunk by chunk along with the classification below
+if stream_test == 0:
+    # the handcrafted test set is identified by its contents
+    if cheat_test == 1: test_key = stc.key('array',X_test_raw,y_test_raw)
+    else:               test_key = stc.key('dataset',[stc.file_key(i) for i in utils.dataset_files(test_pair_num,channel_num)],balance)
+    filter_test_key = stc.key('data_filtering',stc.module_key(utils),test_key,lpf_key,filter_method)
+    filter_test = lambda: stc.cached(filter_test_key, lambda: conditioning(X_test_raw, y_test_raw))
+    features_test_key = stc.key('feature_extraction',stc.module_key(fe),filter_test_key,features,fs,window,wavelet)
+    X_test, y_test = stc.cached(features_test_key, lambda: ins.instrumented(fe.feature_extraction)(features,*filter_test(),fs,window,workers=workers,wavelet=wavelet))
 
 #########################################
 # Normalization of the dataset
 #########################################
 if normalize == 1:
-    if silence == 0: print("Normalizing training set")
-    # we must transform the data to 0 mean and 1 std
-    # for conventional machine learning algorithms to work
-    params = StandardScaler().fit(X_train)
-    X_train_mean = params.mean_
-    X_train_var = params.var_
+    with ins.stage('normalization') as s:
+        if silence == 0: print("Normalizing training set")
+        # we must transform the data to 0 mean and 1 std
+        # for conventional machine learning algorithms to work
+        params = StandardScaler().fit(X_train)
+        X_train_mean = params.mean_
+        X_train_var = params.var_
     
-    # normalization is basically (x - mean) / std
-    X_train = (X_train - X_train_mean)/np.sqrt(X_train_var)
+        # normalization is basically (x - mean) / std
+        X_train = (X_train - X_train_mean)/np.sqrt(X_train_var)
+        s.shapes(X_train)
     
-    if silence == 0: print("Normalizing test set")
-    # Before projecting the test set, it must also be normalized
-    # However, it should be normalized using the training set data
-    # This avoids future data leaking into the algorithm
-    X_test = np.array(X_test)   # we're using numpy here
-    X_test = (X_test - X_train_mean)/np.sqrt(X_train_var)
+        # Before projecting the test set, it must also be normalized
+        # However, it should be normalized using the training set data
+        # This avoids future data leaking into the algorithm
+        # this is done along with the PCA and the SVM decision, in the compiled model below (inference.py)
 
 #########################################
 # Perform PCA on the training set
@@ -158,41 +233,33 @@ if normalize == 1:
 # pick the number of components to retain, top 3 in this case
 pca = PCA(n_components=dimensions)
 # perform the transformation to the new dimension
-pca.fit(X_train)
+ins.instrumented(pca.fit,'pca')(X_train)
 
 if do_pca == 1:
     if silence == 0: print("Reducing dimensions from %d to %d through PCA" % (X_train.shape[1], dimensions))
     # mapping the new sample to the new set of dimensions is simply a dot product
-    X_train = np.matmul(X_train,pca.components_.T)
-    X_test = np.matmul(X_test,pca.components_.T)
+    with ins.stage('pca') as s:
+        X_train = np.matmul(X_train,pca.components_.T)
+        s.shapes(X_train)
 
 #########################################
 # Create a SVM Classifier
 #########################################
-# for more information, check out this link: http://scikit-learn.org/stable/modules/multiclass.html
-if class_type == 'ovr':
-    clf = OneVsRestClassifier(SVC(kernel=kernel, gamma=1, coef0=coef, degree=degree, 
-                                  max_iter=max_iter, C=penalty, random_state =109))
-elif class_type == 'ovo':
-    clf = SVC(kernel=kernel, gamma=1, coef0=coef, degree=degree, 
-              max_iter=max_iter, C=penalty, random_state =109) # SVC is ovo by default, contrary to documentation
-elif class_type == 'ecoc':
-    clf = OutputCodeClassifier(SVC(kernel=kernel, gamma=1, coef0=coef, degree=degree, 
-                                   max_iter=max_iter, C=penalty, random_state =109), random_state=109)
+clf = svm.create_classifier(class_type, kernel, gamma, coef, degree, max_iter, penalty)
 
 # remove convergence warning printouts from SVM training
 if silence == 1: warnings.filterwarnings("ignore")
 
 # Train the model using the training sets
 if silence == 0: print("Training SVM using %s classification" % class_type)
-clf.fit(X_train, y_train)
+ins.instrumented(clf.fit,'training')(X_train, y_train)
 
 #########################################
 # Generate the configuration matrix for the SVM
 #########################################
 # this will be used for manual classification
 if silence == 0: print("Setting up the configuration matrices for SVM")
-alpha_vector, supports, intercept, num_classifiers = svm.config_matrix(clf,class_type,classes)
+alpha_vector, supports, intercept, num_classifiers = ins.instrumented(svm.config_matrix)(clf,class_type,classes)
 
 print("There are %d support vectors" % supports.shape[0])
 #########################################
@@ -202,13 +269,47 @@ if silence == 0: print("Calculating SVM %s kernel and decision matrix" % kernel)
 
 if cheat_test:
     # for handcrafted data, reduce algorithm complexity by reducing the number of support vectors
-    supports = supports[0:size_limit,:]
-    alpha_vector = alpha_vector[:,0:size_limit]
+    alpha_vector, supports, intercept = ins.instrumented(svm.reduce_supports)(alpha_vector, supports, intercept, size_limit, kernel, coef,
+                                                            degree, gamma, size_method, X_train)
+
+# a linear kernel compiles to one weight vector per classifier, None otherwise (exported with print_data)
+linear = svm.linear_model(kernel, coef, degree, alpha_vector, supports, intercept, gamma)
 
-decision, vote = svm.get_decision(X_test, kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers)
+if stream_test == 1:
+    if silence == 0: print("Streaming the test set through the pipeline, %d samples at a time" % chunk_size)
+    if cheat_test == 1: chunks = st.array_chunks(X_test_raw,y_test_raw,chunk_size)
+    else:               chunks = st.read_chunks(test_pair_num,channel_num,chunk_size)
+    
+    with ins.stage('decision'):
+        results = list(st.pipeline(chunks, lpf, fe.FeatureExtractor(features,window,fs,wavelet=wavelet),
+                                   X_train_mean if normalize == 1 else None, X_train_var if normalize == 1 else None,
+                                   pca.components_ if do_pca == 1 else None,
+                                   kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers, gamma, filter_method, sos))
+    # only the reduced features and the decisions are kept, the raw recording never is
+    X_test = np.concatenate([i[0] for i in results])
+    decision = np.concatenate([i[1] for i in results])
+    vote = [j for i in results for j in i[2]]
+    y_test = np.concatenate([i[3] for i in results])
+else:
+    # normalization, PCA and the SVM decision of the test set in one compiled model, same as the streaming pipeline
+    # (a linear kernel folds into a single matvec), the reduced features are kept for the library and the plots
+    model = inference.InferenceModel(X_train_mean if normalize == 1 else None, X_train_var if normalize == 1 else None,
+                                     pca.components_ if do_pca == 1 else None,
+                                     kernel, coef, degree, alpha_vector, supports, intercept, num_classifiers, gamma)
+    with ins.stage('decision') as s:
+        X_test_reduced = np.empty((len(X_test),model.projection.shape[1]))
+        decision = model.decision_function(np.asarray(X_test),reduced=X_test_reduced)
+        vote = np.ndarray.tolist((decision > 0).astype(int))
+        X_test = X_test_reduced
+        s.shapes(X_test, decision)
+
+if cheat_test == 0:
+    # regression check of the manual kernel calculation, all the support vectors are kept here
+    print("Maximum difference from the library decision function: %e" % 
+          np.max(np.abs(decision - svm.library_decision(X_test,clf,class_type))))
 
 if silence == 0: print("Classifying test set...")
-y_manual = svm.predict(X_test, clf, class_type, classes, num_classifiers, decision, vote)
+y_manual = ins.instrumented(svm.predict)(X_test, clf, class_type, classes, num_classifiers, decision, vote)
     
 #########################################
 # Compare model accuracies (computed vs Python library output)
@@ -223,11 +324,29 @@ specificity = sum(sum((y_manual.T == y_test)&(y_test == 0)))/(len(y_test)-sum(y_
 print("Sensitivity: %f" % sensitivity)
 print("Specificity: %f" % specificity)
 
+#########################################
+# Fixed-point model of the datapath
+#########################################
+if (fixed_point == 1) and ((stream_test == 0) or (cheat_test == 1)):
+    fixed_format = fxp.load_format("generated_files/datasize.csv",fixed_rounding,fixed_overflow)
+    if silence == 0: print("Running the fixed-point model with %d bits, %d fractional" % (fixed_format.width, fixed_format.bp))
+    decision_fixed = fxp.datapath(fixed_format, X_test_raw, lpf, features, fs, window,
+                                  X_train_mean if normalize == 1 else None, 1/np.sqrt(X_train_var) if normalize == 1 else None,
+                                  pca.components_ if do_pca == 1 else None,
+                                  kernel, coef, degree, alpha_vector, supports, intercept, sos, gamma)
+    vote_fixed = np.ndarray.tolist((decision_fixed > 0).astype(int))
+    y_fixed = svm.predict(X_test, clf, class_type, classes, num_classifiers, decision_fixed, vote_fixed)
+    print("Accuracy from fixed-point model: %f" % accuracy_score(y_test, y_fixed))
+    print("Maximum difference from the floating point decision: %f" % np.max(np.abs(decision_fixed - decision)))
+elif fixed_point == 1:
+    print("The fixed-point model needs the raw test set, it is skipped when streaming from files")
+    fixed_point = 0
+
 #########################################
 # Plot the data, for presentation
 #########################################
-if (plot_data == 1) and (cheat_test) == 0:
-    offset = window+numtaps-1
+if (plot_data == 1) and (cheat_test == 0) and (stream_test == 0):
+    offset = window+(numtaps-1 if sos is None else 0)
     start_offset = round(offset/2)+1
     end_offset = -round(offset/2)
     y_test_plot = y_test_raw[start_offset:end_offset]
@@ -262,39 +381,92 @@ if print_data == 1:
     
     if silence == 0: print("Printing all configuration parameters to files under generated_files folder")
     fmt = '%.10f' # 10 decimal places as float
-    np.savetxt("generated_files/input.csv",X_test_raw.T,fmt=fmt,delimiter=',')
-    np.savetxt("generated_files/labels.csv",y_test_raw.T,fmt='%d',delimiter=',')
-    np.savetxt("generated_files/expected.csv",decision.T,fmt=fmt,delimiter=',')
+    exporter = export.Writer("generated_files",export_csv)
+    if (stream_test == 0) or (cheat_test == 1):
+        exporter.save("input",X_test_raw.T,fmt)
+        exporter.save("labels",y_test_raw.T,'%d')
+    exporter.save("expected",(decision_fixed if fixed_point == 1 else decision).T,fmt)
     
-    np.savetxt("generated_files/filter_taps.csv",lpf,fmt=fmt,delimiter=',')
+    # only the filter in use, the FIR taps are not used with the IIR filter
+    if sos is None:
+        exporter.save("filter_taps",lpf,fmt)
+    else:
+        # one row per second order section, in the order of the cascade
+        consts_A, consts_B = utils.iir_coefficients(sos)
+        exporter.save("iir_coefficients_A",consts_A,fmt)
+        exporter.save("iir_coefficients_B",consts_B,fmt)
     
-    np.savetxt("generated_files/normalization.csv",np.array([X_train_mean, 1/np.sqrt(X_train_var)]).T,fmt=fmt,delimiter=',')
+    exporter.save("normalization",np.array([X_train_mean, 1/np.sqrt(X_train_var)]).T,fmt)
     
-    np.savetxt("generated_files/pca_vectors.csv",pca.components_,fmt=fmt,delimiter=',')
-    np.savetxt("generated_files/support_vectors.csv",supports,fmt=fmt,delimiter=',')
-    np.savetxt("generated_files/alpha_vectors.csv",alpha_vector,fmt=fmt,delimiter=',')
-    np.savetxt("generated_files/intercepts.csv",intercept,fmt=fmt,delimiter=',')
+    exporter.save("pca_vectors",pca.components_,fmt)
+    exporter.save("support_vectors",supports,fmt)
+    exporter.save("alpha_vectors",alpha_vector,fmt)
+    exporter.save("intercepts",intercept,fmt)
+    if linear is not None:
+        # the linear model with the normalization and PCA folded in, one row of weights per classifier
+        folded_weights, folded_intercept = svm.fold_model(*linear, X_train_mean if normalize == 1 else None,
+                                                          1/np.sqrt(X_train_var) if normalize == 1 else None,
+                                                          pca.components_ if do_pca == 1 else None)
+        exporter.save("folded_weights",folded_weights,fmt)
+        exporter.save("folded_intercepts",folded_intercept,fmt)
     
     for i in features:
-        if i == 'delta': np.savetxt("generated_files/delta_index.csv",utils.get_idx(fe.delta_band,window,fs),fmt='%d',delimiter=',')
-        if i == 'theta': np.savetxt("generated_files/theta_index.csv",utils.get_idx(fe.theta_band,window,fs),fmt='%d',delimiter=',')
-        if i == 'alpha': np.savetxt("generated_files/alpha_index.csv",utils.get_idx(fe.alpha_band,window,fs),fmt='%d',delimiter=',')
-        if i == 'beta': np.savetxt("generated_files/beta_index.csv",utils.get_idx(fe.beta_band,window,fs),fmt='%d',delimiter=',')
-        if i == 'gamma': np.savetxt("generated_files/gamma_index.csv",utils.get_idx(fe.gamma_band,window,fs),fmt='%d',delimiter=',')
+        if i == 'delta': exporter.save("delta_index",utils.get_idx(fe.delta_band,window,fs),'%d')
+        if i == 'theta': exporter.save("theta_index",utils.get_idx(fe.theta_band,window,fs),'%d')
+        if i == 'alpha': exporter.save("alpha_index",utils.get_idx(fe.alpha_band,window,fs),'%d')
+        if i == 'beta': exporter.save("beta_index",utils.get_idx(fe.beta_band,window,fs),'%d')
+        if i == 'gamma': exporter.save("gamma_index",utils.get_idx(fe.gamma_band,window,fs),'%d')
     
-    np.savetxt("generated_files/normalize_band.csv",[fe.band_normalize],fmt=fmt,delimiter=',')
-    np.savetxt("generated_files/normalize_line.csv",[fe.line_normalize],fmt=fmt,delimiter=',')
+    # filter taps and number of levels of the DWT block (DWTParams.scala)
+    dwt_levels = [fe.dwt_feature(i)[1] for i in features if fe.dwt_feature(i) is not None]
+    if len(dwt_levels) > 0:
+        dwt_lpf, dwt_hpf = fe.wavelet_filters(wavelet)
+        exporter.save("dwt_lpf_taps",dwt_lpf,fmt)
+        exporter.save("dwt_hpf_taps",dwt_hpf,fmt)
+        exporter.save("dwt_levels",[max(dwt_levels)],'%d')
+    
+    exporter.save("normalize_band",[fe.band_normalize],fmt)
+    exporter.save("normalize_line",[fe.line_normalize],fmt)
     
     # list of all parameters used in this model, take note of the order, needs to be consistent for the Scala implementation
-    np.savetxt("generated_files/parameters.csv",[window, # windowSize, lanes, nPts, nBins
-                                                 pca.components_.shape[0],  # nFeatures
-                                                 pca.components_.shape[1],  # nDimensions
-                                                 supports.shape[0],    # nSupports
-                                                 classes,   #nClasses
-                                                 degree    #nDegree
-                                                 ],fmt='%d',delimiter=',')
+    exporter.save("parameters",[window, # windowSize, lanes, nPts, nBins
+                                pca.components_.shape[0],  # nFeatures
+                                pca.components_.shape[1],  # nDimensions
+                                supports.shape[0],    # nSupports
+                                classes,   #nClasses
+                                degree    #nDegree
+                                ],'%d')
     
-    np.savetxt("generated_files/feature_list.csv",features,fmt='%s',delimiter=',')
+    exporter.save("feature_list",features,'%s')
     
     if class_type == 'ecoc':
-        np.savetxt("generated_files/codebook.csv",clf.code_book_,fmt=fmt,delimiter=',')
\ No newline at end of file
+        exporter.save("codebook",clf.code_book_,fmt)
+    
+    # fixed-point tables of the bare-metal C test (copy to tests/arrays.h), for the handcrafted single channel input
+    # (the rawVotes lanes of the C test hold a single binary classifier, and its integer reference has no IIR filter)
+    # tests/arrays.h is made from synthetic recordings, from this folder and without the dataset in ../data:
+    #   python benchmark.py --dataset 3 4 5 6 --samples 6000
+    #   python top.py    (with fixed_point = 1 and print_data = 1, the other parameters as listed in arrays.h)
+    if ((fixed_point == 1) and (cheat_test == 1) and (normalize == 1) and (do_pca == 1) and (X_test_raw.shape[1] == 1)
+        and (classes == 2) and (sos is None) and (kernel in ['poly', 'linear'])):
+        ctables.write_header("generated_files/arrays.h", fixed_format, lpf, features, fs, window, X_train_mean,
+                             1/np.sqrt(X_train_var), pca.components_, kernel, degree, alpha_vector, supports, intercept,
+                             X_test_raw, decision_fixed,
+                             {'train_pair_num': train_pair_num, 'channel_num': channel_num, 'balance': balance,
+                              'n_handcraft': n_handcraft, 'numtaps': numtaps, 'cutoff': cutoff, 'features': features,
+                              'window': window, 'fs': fs, 'dimensions': dimensions, 'kernel': kernel, 'degree': degree,
+                              'penalty': penalty, 'max_iter': max_iter, 'class_type': class_type,
+                              'size_limit': size_limit, 'size_method': size_method,
+                              'fixed_rounding': fixed_rounding, 'fixed_overflow': fixed_overflow})
+    if silence == 0:
+        ctables.print_cycles(ctables.predicted_cycles(features, window, fs, len(lpf), pca.components_ if do_pca == 1 else None,
+                                                      supports, alpha_vector, degree, sos))
+    
+    exporter.close({'window': window, 'fs': fs, 'filter_type': filter_type,
+                    'filter_length': len(lpf) if sos is None else len(sos),   # taps or second order sections
+                    'features': features, 'kernel': kernel, 'degree': degree,
+                    'coef': coef, 'gamma': gamma, 'classes': classes, 'class_type': class_type})
+
+if instrument == 1:
+    ins.report()
+    ins.dump("results/stages.json")
@@ -1,6 +1,13 @@
-import csv
+import glob
+import hashlib
 import math
+import os
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import next_fast_len
+from scipy.signal import iirdesign, remez, sosfilt
+
+import parallel as parallel
 
 # Auxillary function to identify the index of the frequency bands (for bandpower)
 def get_idx(freq,n_fft,fs):
@@ -13,57 +20,210 @@ def get_idx(freq,n_fft,fs):
         print("Warning! difference between indices is not a power of 2")
         return [idxStartBin, idxEndBin]    
 
-def load_dataset(pair_num,channel_num,balance):
-    # load the training dataset
+# Signal conditioning low pass filter, cutoff are the band edges in Hz (pass band then stop band)
+def design_filter(numtaps, cutoff, fs):
+    return remez(numtaps=numtaps, bands=cutoff, desired=[1.0, 0.0], fs=fs)
+
+# Signal conditioning IIR filter with the same band edges, as a cascade of second order sections
+# (scipy sos format, one [b0 b1 b2 1 a1 a2] row per section), gpass is the maximum pass band ripple
+# and gstop the minimum stop band attenuation, in dB
+def design_iir_filter(cutoff, fs, gpass=1, gstop=40, ftype='ellip'):
+    return iirdesign(cutoff[1], cutoff[2], gpass, gstop, ftype=ftype, output='sos', fs=fs)
+
+# coefficients of every section as taken by IIRFilter.scala (consts_A, consts_B)
+# the hardware adds the feedback terms instead of subtracting them, hence the sign of consts_A
+def iir_coefficients(sos):
+    return -sos[:,4:6], sos[:,0:3]
+
+# location of the raw dataset files, per channel and pair
+def channel_file(channel,pair):
+    return '../data/channel%d_pairs/channel%d_pair%d.csv' % (channel, channel, pair)
+
+def label_file(pair):
+    return '../data/labels/label%d.csv' % pair
+
+# binary copies of the CSV files, so that they are only parsed once
+cache_dir = '../data/cache'
+
+# Read a CSV file as a 2D float array
+# with cache on, the file is converted once to .npy (keyed by its path and modification time)
+# and every later call opens that copy as a read-only memory map, which does not copy anything
+def read_csv(filename,cache=1):
+    if cache == 0:
+        return np.loadtxt(filename,delimiter=',',ndmin=2)
+    
+    path = os.path.abspath(filename)
+    key = hashlib.md5(path.encode()).hexdigest()[:16]
+    cached = os.path.join(cache_dir,'%s_%s_%d.npy' % (os.path.splitext(os.path.basename(path))[0], key, 
+                                                       os.stat(path).st_mtime_ns))
+    if not os.path.exists(cached):
+        os.makedirs(cache_dir,exist_ok=True)
+        # older copies of the same file are stale now
+        for i in glob.glob(os.path.join(cache_dir,'*_%s_*.npy' % key)):
+            os.remove(i)
+        # write to a temporary file first, so that an interrupted run never leaves a partial cache
+        with open(cached + '.tmp','wb') as f:
+            np.save(f,np.loadtxt(filename,delimiter=',',ndmin=2))
+        os.replace(cached + '.tmp',cached)
+    
+    return np.load(cached,mmap_mode='r')
+
+# first sample kept when balancing, assuming 000....0011111.... format
+def balance_start(labels):
+    keep = 2*round(float(np.sum(labels)))
+    if (keep == 0) or (keep > len(labels)):
+        return 0
+    return len(labels) - keep
+
+# parse (or convert to the cache) a single file, from a worker
+# with the cache on, the workers only write the .npy files and the views are opened afterwards
+def read_csv_task(task):
+    filename, cache = task
+    if cache == 0:
+        return read_csv(filename,0)
+    read_csv(filename,1)
+
+# every file read by load_dataset, in the order it reads them (the channels of each pair, then its labels)
+# the order matters to the cache keys, reordering the channels or the pairs reorders the columns or rows
+def dataset_files(pair_num,channel_num):
+    return [k for j in pair_num for k in [channel_file(i,j) for i in channel_num] + [label_file(j)]]
+
+def load_dataset(pair_num,channel_num,balance,cache=1,workers=1):
+    # with workers, every (pair, channel) file is parsed on its own process first
+    parsed = {}
+    if workers > 1:
+        # a file listed twice is parsed once
+        files = list(dict.fromkeys(dataset_files(pair_num,channel_num)))
+        parsed = dict(zip(files,parallel.run(read_csv_task,[(i,cache) for i in files],workers)))
+    read = lambda filename: parsed[filename] if parsed.get(filename) is not None else read_csv(filename,cache)
+    
+    # views of every file, nothing is copied yet
+    pairsets = []
+    pairlabels = []
     for j in range(len(pair_num)):
-        for i in range(len(channel_num)):
-            temp = []
-            with open('../data/channel%d_pairs/channel%d_pair%d.csv' 
-                      %  (channel_num[i], channel_num[i], pair_num[j])) as csvfile:
-                readCsv = csv.reader(csvfile, delimiter=',')
-                for row in readCsv:
-                    temp.append(row)
-            if i == 0:
-                pairset = np.array(temp)
-            else:
-                pairset = np.concatenate((pairset,np.array(temp)),axis=1)
-        pairset = pairset.astype(float)
-        
-        # load the labels
-        pairlabel = []
-        with open('../data/labels/label%d.csv' % pair_num[j]) as csvfile:
-            readCsv = csv.reader(csvfile, delimiter=',')
-            for row in readCsv:
-                pairlabel.append(row)
+        pairset = [read(channel_file(channel_num[i],pair_num[j])) for i in range(len(channel_num))]
+        pairlabel = read(label_file(pair_num[j])).T
         
-        pairlabel = np.array(pairlabel).T.astype(float)
-        
-        # equalize the number of classes, assuming 000....0011111.... format
+        # equalize the number of classes, this is just a slice of the views
         if balance == 1:
-            pairset = pairset[-2*round(np.asscalar(sum(pairlabel))):,:]
-            pairlabel = pairlabel[-2*round(np.asscalar(sum(pairlabel))):,:]
+            start = balance_start(pairlabel)
+            pairset = [i[start:] for i in pairset]
+            pairlabel = pairlabel[start:]
+        
+        pairsets.append(pairset)
+        pairlabels.append(pairlabel)
     
-        if j == 0:
-            X = pairset
-            y = pairlabel
-        else:
-            X = np.concatenate((X,pairset),axis=0)
-            y = np.concatenate((y,pairlabel),axis=0)
+    # a single pair and channel can be returned as is
+    if len(pairsets) == 1 and len(channel_num) == 1:
+        return pairsets[0][0], pairlabels[0]
+    
+    # otherwise every view is copied once into the final arrays
+    n = sum(len(i) for i in pairlabels)
+    X = np.empty((n,sum(i.shape[1] for i in pairsets[0])))
+    y = np.empty((n,1))
+    offset = 0
+    for pairset, pairlabel in zip(pairsets,pairlabels):
+        column = 0
+        for i in pairset:
+            X[offset:offset+len(pairlabel),column:column+i.shape[1]] = i
+            column += i.shape[1]
+        y[offset:offset+len(pairlabel)] = pairlabel
+        offset += len(pairlabel)
                 
     return X, y
-   
-def data_filtering (X, y, lpf):
-    # now perform filtering on the data
+
+# FIR filtering backends, all of them compute the 'valid' convolution of every column of X with the taps
+# direct convolution below fir_direct_taps taps, otherwise FFT based: a single FFT of the whole signal
+# up to fir_fft_length samples, and overlap-save in blocks of fir_block samples beyond that
+fir_direct_taps = 128
+fir_fft_length = 2**16
+fir_block = 2**13
+
+def fir_method(n_samples, numtaps):
+    if numtaps < fir_direct_taps:
+        return 'direct'
+    if n_samples <= fir_fft_length:
+        return 'fft'
+    return 'overlap_save'
+
+def fir_direct(X, lpf, out):
     for i in range(X.shape[1]):
-        if i == 0:
-            temp = np.convolve(X[:,i],lpf,mode='valid')
-            filtered = temp.reshape((len(temp),1))
-        else:
-            temp = np.convolve(X[:,i],lpf,mode='valid').reshape((len(temp),1))
-            filtered = np.concatenate((filtered,temp),axis=1)    
+        out[:,i] = np.convolve(X[:,i],lpf,mode='valid')
+    return out
+
+# one FFT of all the channels, zero padded to a fast length
+def fir_fft(X, lpf, out):
+    nfft = next_fast_len(X.shape[0])
+    spectrum = np.fft.rfft(X,nfft,axis=0) * np.fft.rfft(lpf,nfft).reshape((-1,1))
+    out[:] = np.fft.irfft(spectrum,nfft,axis=0)[len(lpf)-1:X.shape[0]]
+    return out
+
+# overlap-save: blocks of block samples overlapping by numtaps-1, the first numtaps-1 outputs of each are discarded
+def fir_overlap_save(X, lpf, out, block=None):
+    numtaps = len(lpf)
+    if block is None:
+        block = max(fir_block,next_fast_len(8*numtaps))
+    step = block-numtaps+1
+    response = np.fft.rfft(lpf,block).reshape((1,-1,1))
+    
+    # pad the end so that the last block is complete, the blocks are strided views
+    n = out.shape[0]
+    n_blocks = -(-n // step)
+    padded = np.zeros((n_blocks*step+numtaps-1,X.shape[1]))
+    padded[:X.shape[0]] = X
+    frames = sliding_window_view(padded,block,axis=0)[::step]
+    
+    # a batch of blocks at a time, to bound the memory used
+    batch = max(fir_fft_length // block,1)
+    for start in range(0,n_blocks,batch):
+        stop = min(start+batch,n_blocks)
+        filtered = np.fft.irfft(np.fft.rfft(frames[start:stop],axis=2).transpose(0,2,1) * response,block,axis=1)
+        valid = filtered[:,numtaps-1:].reshape((-1,X.shape[1]))
+        out[start*step:min(stop*step,n)] = valid[:min(stop*step,n)-start*step]
+    return out
+
+fir_methods = {'direct': fir_direct, 'fft': fir_fft, 'overlap_save': fir_overlap_save}
+
+# 'valid' convolution of all the channels (columns) of X, method is 'auto' or one of fir_methods
+def fir(X, lpf, method='auto', out=None):
+    if method == 'auto':
+        method = fir_method(X.shape[0],len(lpf))
+    if method not in fir_methods:
+        raise ValueError("Unknown filtering method '%s', use 'auto', 'direct', 'fft' or 'overlap_save'" % method)
+    if out is None:
+        out = np.empty((max(X.shape[0]-len(lpf)+1,0),X.shape[1]))
+    if out.shape[0] == 0:
+        return out
+    return fir_methods[method](X,lpf,out)
+
+# filter a single channel into its column of the output, from a worker
+def filter_channel(task, X, filtered):
+    lpf, i, method = task
+    fir(X[:,i:i+1],lpf,method,filtered[:,i:i+1])
+   
+def data_filtering (X, y, lpf, workers=1, method='auto'):
+    # now perform filtering on the data, all channels at once or one channel per worker if there are any
+    shape = (X.shape[0]-len(lpf)+1,X.shape[1])
+    if workers > 1:
+        filtered = parallel.run_shared(filter_channel,X,shape,[(lpf,i,method) for i in range(X.shape[1])],workers)
+    else:
+        filtered = fir(X,lpf,method)
     
     lendiff = len(y) - filtered.shape[0] + 1
     # valid labels to match the 'valid' convolution
     valid_labels = y[math.floor(lendiff/2):-math.floor(lendiff/2)+1,0]
     
-    return filtered, valid_labels
\ No newline at end of file
+    return filtered, valid_labels
+
+# IIR filtering of all the channels at once, zi is the state of every section (sections, 2, channels)
+# carried over from the previous chunk, or None to start from zero like the hardware after reset
+# returns the filtered data and the state after the last sample
+def iir(X, sos, zi=None):
+    if zi is None:
+        zi = np.zeros((sos.shape[0],2,X.shape[1]))
+    return sosfilt(sos,X,axis=0,zi=zi)
+
+def iir_filtering(X, y, sos):
+    filtered, zf = iir(X,sos)
+    # the output has one sample per input, so all labels are valid
+    return filtered, y[:,0]
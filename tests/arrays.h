@@ -1,6 +1,29 @@
 #ifndef __ARRAY_H__
 #define __ARRAY_H__
 
+// generated by scripts/top.py (ctables.write_header) with
+//   train_pair_num = [3]
+//   channel_num = [1]
+//   balance = 1
+//   n_handcraft = 50
+//   numtaps = 6
+//   cutoff = [0, 150, 200, 250]
+//   features = ['theta', 'alpha', 'linelength']
+//   window = 32
+//   fs = 32
+//   dimensions = 1
+//   kernel = poly
+//   degree = 1
+//   penalty = 1
+//   max_iter = 10000
+//   class_type = ovo
+//   size_limit = 10
+//   size_method = first
+//   fixed_rounding = floor
+//   fixed_overflow = wrap
+
+#include <stdint.h>
+
 #define DIMENSIONS 3         // number of channels going into the PCA
 #define FEATURES 1           // number of reduced dimensions going into the SVM
 #define SUPPORTS 10           // number of support vectors for SVM
@@ -11,17 +34,35 @@
 
 #define DATA_WIDTH 32         // total bit size
 #define DATA_BP 8         // number of fractional components
+#define SAMPLES 100         // number of input samples
+#define FILTERED 95         // number of filter outputs
+#define WINDOWS 63         // number of windows, with one decision each
+#define KERNEL_DEGREE 1         // degree of the polynomial kernel
+
+// all the tables hold fixed-point integers, the values scaled by 2^DATA_BP
+
+static const int64_t filterTaps[NUMTAPS] = {-31, -15, 147, 147, -15, -31};
+
+static const int64_t pcaVector[FEATURES][DIMENSIONS] = {{182, -92, 155}};
+
+static const int64_t PCANormVector[DIMENSIONS][2] = {{46, 1650}, {11, 26047}, {265, 6741}};
+
+static const int64_t foldedPCAVector[FEATURES][DIMENSIONS] = {{1175, -9337, 4069}};
+
+static const int64_t foldedPCAShift[FEATURES] = {-4026};
+
+static const int64_t SVMSupportVector[SUPPORTS][FEATURES] = {{-156}, {-155}, {-151}, {-145}, {-133}, {-138}, {-155}, {-161}, {-177}, {-180}};
 
-static double pcaVector[FEATURES][DIMENSIONS] = {{0.5431032698, 0.5818986773, 0.6053369043}};
+static const int64_t SVMAlphaVector[CLASSIFIERS][SUPPORTS] = {{-256, -256, -256, -256, -256, -256, -256, -256, -256, -256}};
 
-static double SVMSupportVector[SUPPORTS][FEATURES] = {{-0.9158935467}, {-0.9155814039}, {-0.9153876406}, {-0.9151054178}, {-0.9149624295}, {-0.9147590469}, {-0.9142624858}, {-0.9138086068}, {-0.9137395282}, {-0.9137296489}};
+static const int64_t SVMIntercept[CLASSIFIERS] = {160};
 
-static double SVMAlphaVector[CLASSIFIERS][SUPPORTS] = {{-1.0, -1.0, -1.0, -1.0, -1.0, -1.0, -1.0, -1.0, -1.0, -1.0}};
+static const int64_t in[SAMPLES] = {-448, -215, -768, -536, -655, -697, -625, -503, -463, -354, -446, -242, -611, -94, -747, -253, -448, -339, -660, -616, -153, -24, -527, -236, -95, -81, -703, -738, -638, -94, -692, -445, -32, -359, -237, -526, -241, -127, -754, -192, -9, -193, -553, -162, -689, -424, -70, -543, -547, -668, -125521, -41109, -100912, -94010, -65079, -121170, -54513, -109219, -52569, -38431, -114901, -75001, -39117, -74985, -121606, -59405, -43034, -62094, -7092, -52921, -12365, -110403, -110173, -24654, -77097, -106835, -9279, -83486, -31896, -35072, -14937, -48170, -31879, -83341, -93449, -13327, -73204, -4500, -43079, -48423, -113313, -6465, -70411, -53966, -75758, -97661, -12367, -54569, -127633, -49005};
 
-static double SVMIntercept[CLASSIFIERS] = {6.6405560472};
+static const int64_t filterOut[FILTERED] = {-560, -497, -555, -571, -458, -359, -309, -284, -272, -325, -263, -349, -428, -248, -234, -463, -647, -297, 73, -208, -403, -67, 107, -296, -763, -650, -198, -295, -525, -173, -38, -227, -384, -285, -85, -416, -483, 22, 38, -312, -307, -400, -493, -126, -131, 14668, 11675, -57734, -78280, -60727, -75834, -66761, -72800, -72918, -71304, -58870, -23439, -62609, -89056, -35024, -32893, -92821, -84769, -38120, -35337, -25415, -11518, -9744, -57096, -108746, -52000, -31220, -80179, -50418, -31556, -48910, -25731, -10055, -18360, -24645, -54441, -84170, -47735, -28640, -24135, -4859, -35992, -80898, -50065, -19305, -41055, -62362, -80560, -33554, -10128};
 
-static double in[] = {-1.7489339859, -0.8390265197, -2.9996568755, -2.0930022821, -2.5597323275, -2.7229842157, -2.4412193659, -1.9633178189, -1.8096975773, -1.383549798, -1.7424164568, -0.9443414988, -2.3866432508, -0.3656476908, -2.9178372204, -0.9885974695, -1.7480855929, -1.3239305147, -2.5788391842, -2.4056955327, -0.597766294, -0.0952152728, -2.0597274655, -0.923032153, -0.3708325431, -0.3161800095, -2.7448673659, -2.8828356503, -2.4905087413, -0.3655724897, -2.7049594985, -1.736677125, -0.1263314095, -1.4005041451, -0.9243686581, -2.053453107, -0.940497217, -0.4961229843, -2.945135168, -0.7495670552, -0.0334167333, -0.7555030369, -2.1586680238, -0.6321620146, -2.6903219803, -1.6563194215, -0.2742134907, -2.1191575549, -2.1366739842, -2.6099142836, -490.3165210649, -160.5822335301, -394.185942, -367.2266703139, -254.2134203598, -473.3187274415, -212.941197254, -426.6357125471, -205.3472315484, -150.1208199895, -448.8327855861, -292.9720060902, -152.7999211361, -292.9103652365, -475.023270527, -232.0517970422, -168.1026773901, -242.5554439708, -27.7026220046, -206.722479749, -48.2990423561, -431.2626479269, -430.3618263746, -96.3043556452, -301.1615815072, -417.3229014415, -36.245709802, -326.1170701272, -124.5939484319, -137.0010073248, -58.3469543971, -188.1638964722, -124.5287829863, -325.5508290111, -365.0360541175, -52.056890902, -285.9544050644, -17.5799764258, -168.2792510908, -189.1521398954, -442.6270135233, -25.2553706465, -275.04393326, -210.8051928064, -295.9315986194, -381.4865098785, -48.3102397189, -213.1602566639, -498.5648364844, -191.4275431896};
+static const int64_t windowFeatures[WINDOWS][DIMENSIONS] = {{0, 0, 21}, {0, 0, 21}, {0, 0, 21}, {0, 0, 22}, {0, 0, 23}, {0, 0, 23}, {0, 0, 25}, {0, 0, 25}, {0, 0, 26}, {0, 0, 26}, {0, 0, 26}, {0, 0, 26}, {0, 0, 27}, {0, 0, 26}, {0, 0, 84}, {0, 0, 95}, {0, 0, 365}, {3, 0, 444}, {5, 0, 511}, {4, 0, 569}, {3, 0, 604}, {2, 0, 626}, {2, 0, 626}, {2, 0, 631}, {2, 0, 677}, {2, 0, 815}, {2, 0, 967}, {4, 0, 1070}, {4, 0, 1280}, {3, 0, 1287}, {2, 1, 1520}, {4, 1, 1551}, {4, 0, 1733}, {3, 1, 1743}, {3, 1, 1781}, {3, 1, 1834}, {3, 1, 1841}, {4, 1, 2024}, {6, 2, 2225}, {7, 1, 2446}, {7, 1, 2527}, {4, 2, 2718}, {3, 2, 2834}, {4, 2, 2906}, {5, 2, 2974}, {5, 2, 3006}, {4, 2, 3056}, {3, 2, 2817}, {3, 2, 2761}, {3, 2, 2809}, {3, 2, 2866}, {3, 2, 2973}, {5, 2, 3024}, {6, 2, 3041}, {5, 2, 3110}, {5, 2, 3183}, {5, 2, 3220}, {6, 2, 3188}, {6, 2, 3205}, {8, 1, 3079}, {7, 1, 3154}, {8, 1, 2991}, {7, 1, 3143}};
 
-static double ex[][2] = {{7.476045557122824, 0.0}, {7.470701360331106, 0.0}, {7.468483506091348, 0.0}, {7.457737145433113, 0.0}, {7.445083546429037, 0.0}, {7.446866202312786, 0.0}, {7.420612849255446, 0.0}, {7.421165650937305, 0.0}, {7.401721623291606, 0.0}, {7.404480134471004, 0.0}, {7.402813045966224, 0.0}, {7.4023068487452965, 0.0}, {7.38565790063556, 0.0}, {7.395743719159769, 0.0}, {6.55229037362207, 0.0}, {6.408285479890282, 0.0}, {2.3938123690307913, 0.0}, {1.2133082140110307, 0.0}, {0.21039068641000025, 0.0}, {0.0, 0.6639572205638018}, {0.0, 1.1871543819235244}, {0.0, 1.5243376186295388}, {0.0, 1.5128517188990598}, {0.0, 1.5856969722151346}, {0.0, 2.258293996189}, {0.0, 4.307334627480646}, {0.0, 6.552997004154235}, {0.0, 8.092500545854367}, {0.0, 11.1935515943962}, {0.0, 11.290305558630646}, {0.0, 14.750017172909526}, {0.0, 15.21248001416653}, {0.0, 17.89078537852023}, {0.0, 18.02526893035364}, {0.0, 18.59269189415895}, {0.0, 19.365970550013905}, {0.0, 19.466469852262016}, {0.0, 22.163718301952564}, {0.0, 25.191889382897884}, {0.0, 28.447576669333166}, {0.0, 29.63775853267105}, {0.0, 32.47007577153051}, {0.0, 34.1947721829966}, {0.0, 35.25344792007791}, {0.0, 36.268025808798974}, {0.0, 36.76911837713143}, {0.0, 37.504306866374165}, {0.0, 33.966871892959055}, {0.0, 33.14804706622232}, {0.0, 33.827388769007555}, {0.0, 34.66420169067325}, {0.0, 36.23884167756742}, {0.0, 36.976611516966265}, {0.0, 37.23800192403805}, {0.0, 38.26064320849722}, {0.0, 39.340990457776826}, {0.0, 39.88303982150729}, {0.0, 39.39679337342739}};
+static const int64_t ex[WINDOWS][2] = {{22252, 0}, {22252, 0}, {22252, 0}, {22153, 0}, {22058, 0}, {22058, 0}, {21864, 0}, {21864, 0}, {21766, 0}, {21766, 0}, {21766, 0}, {21766, 0}, {21671, 0}, {21766, 0}, {16162, 0}, {15102, 0}, {0, 10980}, {0, 18693}, {0, 25218}, {0, 30796}, {0, 34148}, {0, 36244}, {0, 36244}, {0, 36730}, {0, 41170}, {0, 54498}, {0, 69183}, {0, 79188}, {0, 99477}, {0, 100121}, {0, 122379}, {0, 125428}, {0, 143232}, {0, 143941}, {0, 147613}, {0, 152732}, {0, 153411}, {0, 171120}, {0, 190369}, {0, 211960}, {0, 219790}, {0, 237929}, {0, 249109}, {0, 256095}, {0, 262683}, {0, 265779}, {0, 270577}, {0, 247466}, {0, 242056}, {0, 246690}, {0, 252194}, {0, 262532}, {0, 267519}, {0, 269184}, {0, 275818}, {0, 282872}, {0, 286446}, {0, 283385}, {0, 285027}, {0, 273136}, {0, 280351}, {0, 264634}, {0, 279283}};
 
 #endif
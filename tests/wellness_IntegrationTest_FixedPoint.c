@@ -6,7 +6,6 @@
 #define WELLNESS_READ_COUNT 0x2108
 
 #include <stdio.h>
-#include <math.h>
 
 #include "mmio.h"
 #include "arrays.h"
@@ -21,31 +20,29 @@
 #define CONF_ADDR_WIDTH 3
 #define CONF_ADDR_MASK ((1L << CONF_ADDR_WIDTH)-1)
 
-void printDouble(double v, int decimalDigits)
+#define TOL_PERCENT 15 // percent tolerance
+
+/**
+ * The tables in arrays.h are already fixed-point integers (scaled by 2^DATA_BP, see scripts/ctables.py),
+ * so nothing is converted from doubles here. Fixed-point values are printed with 4 decimal digits.
+ */
+void printFixed(int64_t v)
 {
     if(v<0){
       printf("-");
       v = -v;
     }
-    printf("%d.", (int)v);
-    for (int i=1; i<=decimalDigits; i++){
-      v = v - (int)v;
-      v *= 10;
-      printf("%d", (int)v);
-    }
-    printf(" ");
+    printf("%d.", (int)(v >> DATA_BP));
+    printf("%04d ", (int)(((v & ((1L << DATA_BP)-1)) * 10000) >> DATA_BP));
 }
 
-uint64_t pack_data(double x) {
-  int64_t dataint = (int64_t)(x * (1L << DATA_BP));
-
+uint64_t pack_data(int64_t dataint) {
   uint64_t datapack = ((uint64_t) dataint) & DATA_MASK;
 
   return datapack;
 }
 
-uint64_t pack_conf_data(int addr,double data) {
-    int64_t dataint = (int64_t)(data * (1L << DATA_BP));
+uint64_t pack_conf_data(int addr,int64_t dataint) {
     int64_t addrint = (int64_t)(addr);
 
     uint64_t datapack = ((uint64_t) dataint) & CONF_DATA_MASK;
@@ -66,21 +63,74 @@ int32_t unpack_pca_1(uint64_t packed) {
   return ((int64_t)(xpack << shift)) >> shift;
 }
 
+/**
+ * Integer reference of the datapath on the core, all integer MACs and shifts (see scripts/ctables.py).
+ * The normalization and the PCA are folded into foldedPCAVector and foldedPCAShift, and the SVM kernel is
+ * polynomial, every product is shifted back by DATA_BP like the hardware stores it.
+ */
+
+// FIR filter output n, the taps are applied in reverse like a convolution
+int64_t referenceFilter(int n)
+{
+  int64_t acc = 0;
+  int j;
+  for(j=0;j<NUMTAPS;j++){
+    acc += in[n+j]*filterTaps[NUMTAPS-1-j];
+  }
+  return acc >> DATA_BP;
+}
+
+// decision of the first classifier for the features of a window
+int64_t referenceDecision(const int64_t *x)
+{
+  int64_t reduced[FEATURES];
+  int64_t acc, linear, kernel;
+  int f,d,s;
+
+  for(f=0;f<FEATURES;f++){
+    acc = 0;
+    for(d=0;d<DIMENSIONS;d++){
+      acc += foldedPCAVector[f][d]*x[d];
+    }
+    reduced[f] = (acc >> DATA_BP) + foldedPCAShift[f];
+  }
+
+  acc = SVMIntercept[0] << DATA_BP;
+  for(s=0;s<SUPPORTS;s++){
+    linear = 0;
+    for(f=0;f<FEATURES;f++){
+      linear += reduced[f]*SVMSupportVector[s][f];
+    }
+    linear >>= DATA_BP;
+    kernel = linear;
+    for(d=1;d<KERNEL_DEGREE;d++){
+      kernel = (kernel*linear) >> DATA_BP;
+    }
+    acc += kernel*SVMAlphaVector[0][s];
+  }
+  return acc >> DATA_BP;
+}
+
 int main(void)
 {
   uint64_t write_data, read_data;
   uint64_t rd_count;
   int64_t pack_out;
   int i,j;
-  int32_t data_out_0;
-  int32_t data_out_1;
-  double data_out_0double;
-  double data_out_1double;
-
-  double tol = 0.15; // percent tolerance
+  int64_t data_out_0;
+  int64_t data_out_1;
+  int64_t reference, expected, difference;
+  int errors;
 
   printf("This test uses %d bits total data width with %d bits for binary places\n",DATA_WIDTH,DATA_BP);
 
+  // the integer reference of the filter must match the fixed-point model exactly
+  errors = 0;
+  for(i=0;i<FILTERED;i++){
+    if (referenceFilter(i) != filterOut[i]) errors++;
+  }
+  printf("Integer reference filter: %d of %d outputs differ from the fixed-point model\n",errors,FILTERED);
+
   // pushing data into the configuration matrices
 
   // pcaVector
@@ -122,7 +172,7 @@ int main(void)
   printf("Done configuring SVM Intercept: %d classifier(s)\n",CLASSIFIERS);
 
   // Mux select for streaming input, 0 if through C code
-  write_data = pack_conf_data(4,0.0);
+  write_data = pack_conf_data(4,0);
   reg_write64(WELLNESSCONF_WRITE, write_data);
   while(reg_read64(WELLNESSCONF_WRITE_COUNT) > 0);
   printf("Passing data through C test instead of external input\n");
@@ -138,7 +188,7 @@ int main(void)
   printf("Done configuring PCA Normalization Vector\n");
 
   // this is the main loop to feed the input vector one by one
-  for(i=0;i<96;i++) {
+  for(i=0;i<SAMPLES;i++) {
     while(reg_read64(WELLNESS_READ_COUNT) == 0) {
         write_data = pack_data(in[i]);
         reg_write64(WELLNESS_WRITE, write_data);
@@ -146,35 +196,43 @@ int main(void)
     pack_out = reg_read64(WELLNESS_READ);
     data_out_0 = unpack_pca_0(pack_out);
     data_out_1 = unpack_pca_1(pack_out);
-    // converting the return value to doubles
-    data_out_0double = (double) data_out_0 / pow(2,DATA_BP);
-    data_out_1double = (double) data_out_1 / pow(2,DATA_BP);
 
     if (i > WINDOW+NUMTAPS+2) { // This is the part where the output starts being correct
         printf("Scores: ");
-        printDouble(data_out_0double,4);
+        printFixed(data_out_0);
         printf(" ");
-        printDouble(data_out_1double,4);
+        printFixed(data_out_1);
         printf(" ");
 
         printf("\tExpected: ");
-        printDouble(ex[i-(WINDOW+NUMTAPS)][0],4);
+        printFixed(ex[i-(WINDOW+NUMTAPS)][0]);
         printf(" ");
-        printDouble(ex[i-(WINDOW+NUMTAPS)][1],4);
-
-        if (data_out_0double > 0) {
-            if ((data_out_0double <= ex[i-(WINDOW+NUMTAPS)][0]*(1+tol)) && // tolerance check
-                (data_out_0double >= ex[i-(WINDOW+NUMTAPS)][0]*(1-tol))) {
-                printf("\tPASSED (within %d\%)", (int)(tol*100));
+        printFixed(ex[i-(WINDOW+NUMTAPS)][1]);
+
+        // the integer reference is checked against the signed expected decision
+        reference = referenceDecision(windowFeatures[i-(WINDOW+NUMTAPS)]);
+        expected = ex[i-(WINDOW+NUMTAPS)][1] - ex[i-(WINDOW+NUMTAPS)][0];
+        difference = reference - expected;
+        if (difference < 0) difference = -difference;
+        if (expected < 0) expected = -expected;
+        printf("\tReference: ");
+        printFixed(reference);
+        if (difference*100 <= expected*TOL_PERCENT) { printf("(within %d%%)", TOL_PERCENT); }
+        else { printf("(REFERENCE FAIL, not within %d%%)", TOL_PERCENT); }
+
+        if (data_out_0 > 0) {
+            if ((data_out_0*100 <= ex[i-(WINDOW+NUMTAPS)][0]*(100+TOL_PERCENT)) && // tolerance check
+                (data_out_0*100 >= ex[i-(WINDOW+NUMTAPS)][0]*(100-TOL_PERCENT))) {
+                printf("\tPASSED (within %d%%)", TOL_PERCENT);
                 }
-            else { printf("\tFAIL (not within %d\%)", (int)(tol*100));}
+            else { printf("\tFAIL (not within %d%%)", TOL_PERCENT);}
             printf("\tPredicted label: No seizure");
-        } else if (data_out_1double > 0) {
-            if ((data_out_1double <= ex[i-(WINDOW+NUMTAPS)][1]*(1+tol)) && // tolerance check
-                (data_out_1double >= ex[i-(WINDOW+NUMTAPS)][1]*(1-tol))) {
-                printf("\tPASSED (within %d\%)", (int)(tol*100));
+        } else if (data_out_1 > 0) {
+            if ((data_out_1*100 <= ex[i-(WINDOW+NUMTAPS)][1]*(100+TOL_PERCENT)) && // tolerance check
+                (data_out_1*100 >= ex[i-(WINDOW+NUMTAPS)][1]*(100-TOL_PERCENT))) {
+                printf("\tPASSED (within %d%%)", TOL_PERCENT);
                 }
-            else { printf("\tFAIL (not within %d\%)", (int)(tol*100));}
+            else { printf("\tFAIL (not within %d%%)", TOL_PERCENT);}
             printf("\tPredicted label: SEIZURE");
         }
 